@@ -25,6 +25,7 @@ from __future__ import print_function
 import tweepy
 import json
 from pymongo import MongoClient
+from writer import MongoWriter
 # assuming you have mongoDB installed locally
 # and a database called 'test'
 MONGO_HOST= 'mongodb://localhost/bda1'
@@ -43,6 +44,11 @@ ACCESS_TOKEN_SECRET = "ACCESS_TOKEN_SECRET"
 class StreamListener(tweepy.StreamListener):    
     #This is a class provided by tweepy to access the Twitter Streaming API. 
 
+    def __init__(self, writer, api=None):
+        super(StreamListener, self).__init__(api=api)
+        # The writer keeps the connection to mongo and stores the tweets in batches
+        self.writer = writer
+
     def on_connect(self):
         # Called initially to connect to the Streaming API
         print("You are now connected to the streaming API.")
@@ -51,15 +57,15 @@ class StreamListener(tweepy.StreamListener):
         # On error - if an error occurs, display the error / status code
         print('An Error has occured: ' + repr(status_code))
         return False
+
+    def on_disconnect(self, notice):
+        # Twitter closed the stream, store the tweets that are still buffered
+        print('Disconnected: ' + repr(notice))
+        self.writer.flush()
  
     def on_data(self, data):
-        #This is the meat of the script...it connects to your mongoDB and stores the tweet
+        #This is the meat of the script...it decodes the tweet and hands it to the writer
         try:
-            client = MongoClient(MONGO_HOST)
-            
-            # Use test database. If it doesn't exist, it will be created.
-            db = client.lab1
-    
             # Decode the JSON from Twitter
             datajson = json.loads(data)
             
@@ -70,9 +76,9 @@ class StreamListener(tweepy.StreamListener):
             #print out a message to the screen that we have collected a tweet
             #print("Tweet collected at " + str(created_at) + " from user @" + username)
             
-            #insert the data into the mongoDB into a collection called twitter_search
-            #if twitter_search doesn't exist, it will be created.
-            db.twitterTest.insert(datajson)
+            #queue the data to be inserted into the mongoDB, the writer stores it
+            #in batches in the collection twitterTest of the lab1 database
+            self.writer.write(datajson)
         except Exception as e:
             print(e)
 
@@ -85,10 +91,15 @@ class StreamListener(tweepy.StreamListener):
 auth = tweepy.OAuthHandler(CONSUMER_KEY, CONSUMER_SECRET)
 auth.set_access_token(ACCESS_TOKEN, ACCESS_TOKEN_SECRET)
 #Set up the listener. The 'wait_on_rate_limit=True' is needed to help with Twitter API rate limiting.
-listener = StreamListener(api=tweepy.API(wait_on_rate_limit=True))
+writer = MongoWriter(MONGO_HOST, 'lab1', 'twitterTest')
+listener = StreamListener(writer, api=tweepy.API(wait_on_rate_limit=True))
 streamer = tweepy.Stream(auth=auth, listener=listener)
 #print("Tracking: " + str(WORDS))
-streamer.filter(track=WORDS)
+try:
+    streamer.filter(track=WORDS)
+finally:
+    # Store the tweets left in the buffer
+    writer.close()
 
 
 # After leaving the streamer capture data for a while, we can see how many tweets we where able to store:
@@ -102,13 +113,16 @@ import matplotlib.pyplot as plt
 from collections import Counter
 import numpy as np
 import operator
+from analysis import default_engine, HashtagCounter
+from indexes import count_tweets
+from invindex import InvertedIndex
 
 # Establish connection with database
 client = MongoClient()
 db = client.lab1
 col = db.twitterTest
 
-print('Total tweets captured: ', col.count_documents(filter={}))
+print('Total tweets captured: ', count_tweets(col))
 
 
 # We retrieve the tweets with only the data that we will use:
@@ -117,13 +131,14 @@ print('Total tweets captured: ', col.count_documents(filter={}))
 
 
 #######################################################
-# Retrieve data from the mongodb database, choosing
-# the fields you'll need afterwards
+# Retrieve data from the mongodb database in a single
+# pass, every chart below reads from the results
 #######################################################
-my_tweets = db.twitterTest.find({},{'lang':1, '_id':0, 'text':1, 'entities.hashtags':1,
-'in_reply_to_status_id':1, 'is_quote_status':1, 'retweeted_status':1, 'user.screen_name':1, 
-'entities.user_mentions': 1, 'place': 1, '_id': 1})
-numTweets = db.twitterTest.count_documents(filter={})
+words_lower = ['felizmartes','#paro', '#tuesdaymotivation', '#guyfawkesnight', '#amazon', '#marvel', '#stillhereforwonho', '#wayv_lovetalk', '#mardiconseil', '#whatnottowearatwalmart'] 
+engine = default_engine()
+engine.register(HashtagCounter('filtered_hashtags', lower=True, only=words_lower))
+results = engine.run(db.twitterTest)
+numTweets = results.total
 
 
 # We plot the data using different criteria to better understand what we where able to capture.
@@ -134,12 +149,7 @@ numTweets = db.twitterTest.count_documents(filter={})
 ####################################################
 # Plot of Languages (autodetected by Twitter)
 ####################################################
-my_tweets.rewind()
-langsList = []
-for t in my_tweets:
-    langsList.append(t['lang'])
-
-D = Counter(langsList)
+D = results['languages']
 subset = dict(D.most_common(15))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 # ----------- Bar Plot ------------------------
@@ -158,20 +168,11 @@ plt.show()
 # Plot how many of them are retweets, replies,
 # quotations or original tweets
 ##############################################################
-my_tweets.rewind() #Reset cursor
-retweets = 0
-replies = 0
-quotations = 0
-originals = 0
-for t in my_tweets:
-    if t.get('retweeted_status') is not None:
-        retweets=retweets+1
-    elif t['is_quote_status'] is not False:
-        quotations = quotations+1
-    elif t.get('in_reply_to_status_id') is not None:
-        replies = replies+1
-    else:
-        originals = originals+1
+types = results['types']
+retweets = types['retweet']
+replies = types['reply']
+quotations = types['quote_status']
+originals = types['original']
 
 # ----------- Pie Chart ------------------------
 labels = 'Original Content', 'Retweets', 'Quotations', 'Replies'
@@ -197,15 +198,7 @@ plt.show()
 ##################################################################
 # Plot only filtered hashtags
 ##################################################################
-my_tweets.rewind()
-hashList = [] 
-words_lower = ['felizmartes','#paro', '#tuesdaymotivation', '#guyfawkesnight', '#amazon', '#marvel', '#stillhereforwonho', '#wayv_lovetalk', '#mardiconseil', '#whatnottowearatwalmart'] 
-for t in my_tweets:
-    for e in t['entities']['hashtags']:
-        if '#' + e['text'].lower() in words_lower or e['text'].lower() in words_lower:
-            h = e['text'].lower()
-            hashList.append(h)
-D = Counter(hashList)
+D = results['filtered_hashtags']
 subset = dict(D)
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
@@ -222,7 +215,7 @@ plt.show()
 
 
 # ----------- Pie Chart ------------------------
-others = len(hashList) - subset['stillhereforwonho'] - subset['wayv_lovetalk'] - subset['felizmartes']
+others = sum(subset.values()) - subset['stillhereforwonho'] - subset['wayv_lovetalk'] - subset['felizmartes']
 labels = 'StillHereForWonho', 'WayV_LoveTalk', 'FelizMartes', 'Others'
 sizes = [subset['stillhereforwonho'], subset['wayv_lovetalk'], subset['felizmartes'], others]
 frequencies = [x/numTweets for x in sizes]
@@ -246,15 +239,7 @@ plt.show()
 ##################################################################
 
 
-my_tweets.rewind()
-hashList = []
-for t in my_tweets:
-    for e in t['entities']['hashtags']:
-        h = e['text']
-#         if not is_ascii(h):
-#             h=asd
-        hashList.append(h)
-D = Counter(hashList)
+D = results['hashtags']
 subset = dict(D.most_common(15))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
@@ -272,22 +257,12 @@ plt.show()
 # In[150]:
 
 
-wonho = 0
-wayv = 0
-never = 0
-mx = 0
-others = 0
-for h in hashList:
-    if h =='StillHereForWonho':
-        wonho=wonho+1
-    elif h =='WayV_LoveTalk': 
-        wayv=wayv+1
-    elif h=='절대로_포기는_안해':
-        never=never+1
-    elif h=='MXTikiTaka1stWin':
-        mx=mx+1
-    else:
-        others=others+1
+D = results['hashtags']
+wonho = D['StillHereForWonho']
+wayv = D['WayV_LoveTalk']
+never = D['절대로_포기는_안해']
+mx = D['MXTikiTaka1stWin']
+others = sum(D.values()) - wonho - wayv - never - mx
 # ----------- Pie Chart ------------------------
 labels = 'StillHereForWonho', 'WayV_LoveTalk', 'NeverGiveUp', 'MxTikiTaka1stWin', 'Others'
 sizes = [wonho, wayv, never, mx, others]
@@ -307,22 +282,12 @@ plt.show()
 # In[152]:
 
 
-wonho = 0
-wayv = 0
-never = 0
-mx = 0
-others = 0
-for h in hashList:
-    if h =='StillHereForWonho' or h=='MONSTA_X':
-        wonho=wonho+1
-    elif h =='WayV_LoveTalk' or h=='WayV' or h=='LoveTalkWithWayV_TEN': 
-        wayv=wayv+1
-    elif h=='절대로_포기는_안해':
-        never=never+1
-    elif h=='MXTikiTaka1stWin':
-        mx=mx+1
-    else:
-        others=others+1
+D = results['hashtags']
+wonho = D['StillHereForWonho'] + D['MONSTA_X']
+wayv = D['WayV_LoveTalk'] + D['WayV'] + D['LoveTalkWithWayV_TEN']
+never = D['절대로_포기는_안해']
+mx = D['MXTikiTaka1stWin']
+others = sum(D.values()) - wonho - wayv - never - mx
 # ----------- Pie Chart ------------------------
 labels = 'MONSTA_X-Wonho', 'WayV', 'NeverGiveUp', 'MxTikiTaka1stWin', 'Others'
 sizes = [wonho, wayv, never, mx, others]
@@ -345,13 +310,7 @@ plt.show()
 ##################################################################
 # Plot most common countries
 ##################################################################
-my_tweets.rewind()
-geo = []
-for t in my_tweets:
-    if t['place']: 
-        geo.append(t['place']['country'])
-
-D = Counter(geo)
+D = results['countries']
 subset = dict(D.most_common(15))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
@@ -375,13 +334,7 @@ plt.show()
 ##################################################################
 # Plot users mentioned
 ##################################################################
-my_tweets.rewind()
-hashList = []
-for t in my_tweets:
-    for e in t['entities']['user_mentions']:
-        h = e['screen_name']
-        hashList.append(h)
-D = Counter(hashList)
+D = results['mentions']
 subset = dict(D.most_common(15))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
@@ -418,6 +371,10 @@ WORDS = ['#FelizMartes','#ChernobylSky', '#paro', '#PorTuCaraDeMartes', '#Tuesda
 class StreamListener2(tweepy.StreamListener):    
     #This is a class provided by tweepy to access the Twitter Streaming API. 
 
+    def __init__(self, writer, api=None):
+        super(StreamListener2, self).__init__(api=api)
+        self.writer = writer
+
     def on_connect(self):
         # Called initially to connect to the Streaming API
         print("You are now connected to the streaming API.")
@@ -426,19 +383,19 @@ class StreamListener2(tweepy.StreamListener):
         # On error - if an error occurs, display the error / status code
         print('An Error has occured: ' + repr(status_code))
         return False
+
+    def on_disconnect(self, notice):
+        # Twitter closed the stream, store the tweets that are still buffered
+        print('Disconnected: ' + repr(notice))
+        self.writer.flush()
  
     def on_data(self, data):
-        #This is the meat of the script...it connects to your mongoDB and stores the tweet
+        #This is the meat of the script...it decodes the tweet and hands it to the writer
         try:
-            client = MongoClient(MONGO_HOST)
-            
-            # Use test database. If it doesn't exist, it will be created.
-            db = client.lab1
-    
             # Decode the JSON from Twitter
             datajson = json.loads(data)
 
-            db.twitterTest2.insert(datajson)
+            self.writer.write(datajson)
         except Exception as e:
             print(e)
 
@@ -449,10 +406,14 @@ class StreamListener2(tweepy.StreamListener):
 auth = tweepy.OAuthHandler(CONSUMER_KEY, CONSUMER_SECRET)
 auth.set_access_token(ACCESS_TOKEN, ACCESS_TOKEN_SECRET)
 #Set up the listener. The 'wait_on_rate_limit=True' is needed to help with Twitter API rate limiting.
-listener = StreamListener2(api=tweepy.API(wait_on_rate_limit=True))
+writer = MongoWriter(MONGO_HOST, 'lab1', 'twitterTest2')
+listener = StreamListener2(writer, api=tweepy.API(wait_on_rate_limit=True))
 streamer = tweepy.Stream(auth=auth, listener=listener)
 #print("Tracking: " + str(WORDS))
-streamer.filter(track=WORDS)
+try:
+    streamer.filter(track=WORDS)
+finally:
+    writer.close()
 
 
 # In[155]:
@@ -468,13 +429,17 @@ col2 = db.twitterTest2
 
 
 #######################################################
-# Retrieve data from the mongodb database, choosing
-# the fields you'll need afterwards
+# Retrieve data from the mongodb database in a single
+# pass, every chart below reads from the results
 #######################################################
-my_tweets = db.twitterTest2.find({},{'lang':1, '_id':0, 'text':1, 'entities.hashtags':1,
-'in_reply_to_status_id':1, 'is_quote_status':1, 'retweeted_status':1, 'user.screen_name':1, 
-'entities.user_mentions': 1, 'place': 1, '_id': 1})
-numTweets = db.twitterTest.count_documents(filter={})
+words_lower = ['#felizmartes','#paro', '#chernobylsky', '#portucarademartes', '#tuesdaythoughts', '#5nov', '#primerapagina', '#somostodosallan', '#buenmartes', '#ultimahora', '#ahora', '#electionday', '#tuesdaymorning', '#debateelectoral'] 
+engine = default_engine()
+engine.register(HashtagCounter('filtered_hashtags', lower=True, only=words_lower))
+# hashtag/mention/country indexes for the "X filtered by Y" charts
+engine.register(InvertedIndex())
+results = engine.run(db.twitterTest2)
+index = results['index']
+numTweets = results.total
 
 
 # The total number of tweets that were able to be retrieve are: 
@@ -493,12 +458,7 @@ print('Number of tweets: ', numTweets)
 ####################################################
 # Plot of Languages (autodetected by Twitter)
 ####################################################
-my_tweets.rewind()
-langsList = []
-for t in my_tweets:
-    langsList.append(t['lang'])
-
-D = Counter(langsList)
+D = results['languages']
 subset = dict(D.most_common(15))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 # ----------- Bar Plot ------------------------
@@ -517,20 +477,11 @@ plt.show()
 # Plot how many of them are retweets, replies,
 # quotations or original tweets
 ##############################################################
-my_tweets.rewind() #Reset cursor
-retweets = 0
-replies = 0
-quotations = 0
-originals = 0
-for t in my_tweets:
-    if t.get('retweeted_status') is not None:
-        retweets=retweets+1
-    elif t['is_quote_status'] is not False:
-        quotations = quotations+1
-    elif t.get('in_reply_to_status_id') is not None:
-        replies = replies+1
-    else:
-        originals = originals+1
+types = results['types']
+retweets = types['retweet']
+replies = types['reply']
+quotations = types['quote_status']
+originals = types['original']
 
 # ----------- Pie Chart ------------------------
 labels = 'Original Content', 'Retweets', 'Quotations', 'Replies'
@@ -556,15 +507,7 @@ plt.show()
 ##################################################################
 # Plot only filtered hashtags
 ##################################################################
-my_tweets.rewind()
-hashList = [] 
-words_lower = ['#felizmartes','#paro', '#chernobylsky', '#portucarademartes', '#tuesdaythoughts', '#5nov', '#primerapagina', '#somostodosallan', '#buenmartes', '#ultimahora', '#ahora', '#electionday', '#tuesdaymorning', '#debateelectoral'] 
-for t in my_tweets:
-    for e in t['entities']['hashtags']:
-        if '#' + e['text'].lower() in words_lower or e['text'].lower() in words_lower:
-            h = e['text'].lower()
-            hashList.append(h)
-D = Counter(hashList)
+D = results['filtered_hashtags']
 subset = dict(D)
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
@@ -581,7 +524,7 @@ plt.show()
 
 
 # ----------- Pie Chart ------------------------
-others = len(hashList) - subset['somostodosallan'] - subset['debateelectoral'] - subset['felizmartes'] - subset['tuesdaythoughts'] - subset['5nov'] - subset['electionday']
+others = sum(subset.values()) - subset['somostodosallan'] - subset['debateelectoral'] - subset['felizmartes'] - subset['tuesdaythoughts'] - subset['5nov'] - subset['electionday']
 labels = 'SomosTodosAllan', 'DebateElectoral', 'FelizMartes', 'TuesdayThoughts', '5Nov', 'ElectionDay', 'Others'
 sizes = [subset['somostodosallan'], subset['debateelectoral'], subset['felizmartes'], subset['tuesdaythoughts'], subset['5nov'], subset['electionday'], others]
 frequencies = [x/numTweets for x in sizes]
@@ -603,13 +546,7 @@ plt.show()
 ##################################################################
 # Plot secondary hashtags
 ##################################################################
-my_tweets.rewind()
-hashList = []
-for t in my_tweets:
-    for e in t['entities']['hashtags']:
-        h = e['text']
-        hashList.append(h)
-D = Counter(hashList)
+D = results['hashtags']
 subset = dict(D.most_common(15))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
@@ -630,13 +567,7 @@ plt.show()
 ##################################################################
 # Plot most common countries
 ##################################################################
-my_tweets.rewind()
-geo = []
-for t in my_tweets:
-    if t['place']: 
-        geo.append(t['place']['country'])
-
-D = Counter(geo)
+D = results['countries']
 subset = dict(D.most_common(15))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
@@ -657,24 +588,13 @@ plt.show()
 ##################################################################
 # Plot countries by hashtags
 ##################################################################
-my_tweets.rewind()
-data = []
-for t in my_tweets:
-    for e in t['entities']['hashtags']:
-        if t['place']: 
-            d = {'hashtag': e['text'], 'country': t['place']['country']}
-            data.append(d)
+data = results['hashtags_by_country']
 
 
 # In[166]:
 
 
-us = []
-for d in data:
-    if d['country'] == 'United States':
-        us.append(d['hashtag'])
-
-D = Counter(us)
+D = data['United States']
 subset = dict(D.most_common(15))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
@@ -692,12 +612,7 @@ plt.show()
 # In[167]:
 
 
-vzla = []
-for d in data:
-    if d['country'] == 'Venezuela':
-        vzla.append(d['hashtag'])
-
-D = Counter(vzla)
+D = data['Venezuela']
 subset = dict(D.most_common(15))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
@@ -715,12 +630,7 @@ plt.show()
 # In[191]:
 
 
-brazil = []
-for d in data:
-    if d['country'] == 'Brasil':
-        brazil.append(d['hashtag'])
-
-D = Counter(brazil)
+D = data['Brasil']
 subset = dict(D.most_common(15))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
@@ -741,13 +651,7 @@ plt.show()
 ##################################################################
 # Plot users mentioned
 ##################################################################
-my_tweets.rewind()
-hashList = []
-for t in my_tweets:
-    for e in t['entities']['user_mentions']:
-        h = e['screen_name']
-        hashList.append(h)
-D = Counter(hashList)
+D = results['mentions']
 subset = dict(D.most_common(15))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
@@ -774,15 +678,7 @@ plt.show()
 ##################################################################
 # Plot users mentioned by hashtag: SomosTodosAllan
 ##################################################################
-my_tweets.rewind()
-user = []
-for t in my_tweets:
-    for e in t['entities']['user_mentions']:
-        if 'SomosTodosAllan' in [e['text'] for e in t['entities']['hashtags']]:
-            u = e['screen_name']
-            user.append(u)
-D = Counter(user)
-subset = dict(D.most_common(15))
+subset = dict(index.top('mention', 15, where=[('hashtag', 'SomosTodosAllan')]))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
 # ----------- Horizontal Bar Plot ------------------------
@@ -802,15 +698,7 @@ plt.show()
 ##################################################################
 # Plot users mentioned by hashtag: 5Nov
 ##################################################################
-my_tweets.rewind()
-user = []
-for t in my_tweets:
-    for e in t['entities']['user_mentions']:
-        if '5Nov' in [e['text'] for e in t['entities']['hashtags']]:
-            u = e['screen_name']
-            user.append(u)
-D = Counter(user)
-subset = dict(D.most_common(15))
+subset = dict(index.top('mention', 15, where=[('hashtag', '5Nov')]))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
 # ----------- Horizontal Bar Plot ------------------------
@@ -830,16 +718,7 @@ plt.show()
 ##################################################################
 # Plot hashtags for user NicolasMaduro
 ##################################################################
-my_tweets.rewind()
-hashList = []
-for t in my_tweets:
-    for e in t['entities']['user_mentions']:
-        if e['screen_name'] == 'NicolasMaduro':
-            for h in t['entities']['hashtags']:
-                hashList.append(h['text'])
-
-D = Counter(hashList)
-subset = dict(D.most_common(15))
+subset = dict(index.top('hashtag', 15, where=[('mention', 'NicolasMaduro')], weighted=True))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
 # ----------- Horizontal Bar Plot ------------------------
@@ -859,15 +738,7 @@ plt.show()
 ##################################################################
 # Plot users mentioned by hashtag: DebateElectoral
 ##################################################################
-my_tweets.rewind()
-user = []
-for t in my_tweets:
-    for e in t['entities']['user_mentions']:
-        if 'DebateElectoral' in [e['text'] for e in t['entities']['hashtags']]:
-            u = e['screen_name']
-            user.append(u)
-D = Counter(user)
-subset = dict(D.most_common(15))
+subset = dict(index.top('mention', 15, where=[('hashtag', 'DebateElectoral')]))
 sorted_subset = sorted(subset.items(), key=operator.itemgetter(1))
 
 # ----------- Horizontal Bar Plot ------------------------
@@ -0,0 +1,291 @@
+from __future__ import division
+from collections import Counter, defaultdict
+
+#######################################################
+# Single pass analysis of the tweets stored in mongo.
+# Every aggregator registered in the engine receives
+# each tweet of the cursor once, so the collection is
+# only read one time no matter how many charts we make
+#######################################################
+
+TYPES = ('original', 'retweet', 'quote_status', 'reply')
+
+
+def tweet_type(t):
+    # How the content was generated: retweets, quotations, replies or original tweets.
+    # Stored in the tweet by enrich.Enricher
+    if 'tweet_type' in t:
+        return t['tweet_type']
+    if t.get('retweeted_status') is not None:
+        return 'retweet'
+    elif t.get('is_quote_status', False) is not False:
+        return 'quote_status'
+    elif t.get('in_reply_to_status_id') is not None:
+        return 'reply'
+    return 'original'
+
+
+def full_text(t):
+    # Text without the 140 characters cut, from the retweet if needed
+    if 'full_text' in t:
+        return t['full_text']
+    if 'extended_tweet' in t:
+        return t['extended_tweet']['full_text']
+    elif 'retweeted_status' in t and 'extended_tweet' in t['retweeted_status']:
+        return t['retweeted_status']['extended_tweet']['full_text']
+    return t['text']
+
+
+def hashtags(t):
+    return [e['text'] for e in t.get('entities', {}).get('hashtags', [])]
+
+
+def mentions(t):
+    return [e['screen_name'] for e in t.get('entities', {}).get('user_mentions', [])]
+
+
+def country(t):
+    if t.get('place'):
+        return t['place'].get('country')
+    return None
+
+
+class Aggregator(object):
+    #Base class of the aggregators, 'fields' are the fields of the tweet the
+    #aggregator needs, the engine uses them to build the projection of the query
+
+    fields = ()
+
+    def __init__(self, name):
+        self.name = name
+
+    def add(self, t):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class CounterAggregator(Aggregator):
+    #Counts the values returned by 'keys' for every tweet
+
+    def __init__(self, name):
+        super(CounterAggregator, self).__init__(name)
+        self.counter = Counter()
+
+    def keys(self, t):
+        raise NotImplementedError
+
+    def add(self, t):
+        self.counter.update(self.keys(t))
+
+    def result(self):
+        return self.counter
+
+
+class LanguageCounter(CounterAggregator):
+    fields = ('lang',)
+
+    def __init__(self, name='languages'):
+        super(LanguageCounter, self).__init__(name)
+
+    def keys(self, t):
+        return [t.get('lang')]
+
+
+class TypeCounter(CounterAggregator):
+    # Only the id of the retweeted status is needed to know if it is a retweet,
+    # and only tweet_type if the tweet was enriched
+    fields = ('tweet_type', 'retweeted_status.id', 'is_quote_status', 'in_reply_to_status_id')
+
+    def __init__(self, name='types'):
+        super(TypeCounter, self).__init__(name)
+        self.counter.update(dict.fromkeys(TYPES, 0))
+
+    def keys(self, t):
+        return [tweet_type(t)]
+
+
+class HashtagCounter(CounterAggregator):
+    #With lower=True hashtags are counted in lower case, 'only' restricts the
+    #count to a list of hashtags (with or without the '#')
+    fields = ('entities.hashtags.text',)
+
+    def __init__(self, name='hashtags', lower=False, only=None):
+        super(HashtagCounter, self).__init__(name)
+        self.lower = lower
+        self.only = None
+        if only is not None:
+            self.only = set(h.lower().lstrip('#') for h in only)
+
+    def keys(self, t):
+        tags = hashtags(t)
+        if self.lower:
+            tags = [h.lower() for h in tags]
+        if self.only is not None:
+            tags = [h for h in tags if h.lower() in self.only]
+        return tags
+
+
+class CountryCounter(CounterAggregator):
+    fields = ('place.country',)
+
+    def __init__(self, name='countries'):
+        super(CountryCounter, self).__init__(name)
+
+    def keys(self, t):
+        c = country(t)
+        return [c] if c is not None else []
+
+
+class MentionCounter(CounterAggregator):
+    fields = ('entities.user_mentions.screen_name',)
+
+    def __init__(self, name='mentions'):
+        super(MentionCounter, self).__init__(name)
+
+    def keys(self, t):
+        return mentions(t)
+
+
+class HashtagByCountry(Aggregator):
+    #Hashtags used in each country, only for the tweets that have location
+    fields = ('entities.hashtags.text', 'place.country')
+
+    def __init__(self, name='hashtags_by_country'):
+        super(HashtagByCountry, self).__init__(name)
+        self.counters = defaultdict(Counter)
+
+    def add(self, t):
+        c = country(t)
+        if c is not None:
+            self.counters[c].update(hashtags(t))
+
+    def result(self):
+        return self.counters
+
+
+class MentionsByHashtag(CounterAggregator):
+    #Users mentioned in the tweets that use the given hashtag
+    fields = ('entities.hashtags.text', 'entities.user_mentions.screen_name')
+
+    def __init__(self, hashtag, name=None):
+        super(MentionsByHashtag, self).__init__(name or 'mentions_by_' + hashtag)
+        self.hashtag = hashtag
+
+    def keys(self, t):
+        if self.hashtag in hashtags(t):
+            return mentions(t)
+        return []
+
+
+class HashtagsByMention(CounterAggregator):
+    #Hashtags used in the tweets that mention the given user, counted once for
+    #every time the user is mentioned
+    fields = ('entities.hashtags.text', 'entities.user_mentions.screen_name')
+
+    def __init__(self, screen_name, name=None):
+        super(HashtagsByMention, self).__init__(name or 'hashtags_by_' + screen_name)
+        self.screen_name = screen_name
+
+    def keys(self, t):
+        return hashtags(t) * mentions(t).count(self.screen_name)
+
+
+class Results(dict):
+    #Result of every aggregator by name, plus the number of tweets read
+
+    def __init__(self, total=0):
+        super(Results, self).__init__()
+        self.total = total
+
+    def top(self, name, n=15):
+        # The n most common values sorted from less to more common, ready for a
+        # horizontal bar plot
+        return sorted(self[name].most_common(n), key=lambda kv: kv[1])
+
+
+class AnalysisEngine(object):
+
+    def __init__(self, aggregators=()):
+        self.aggregators = []
+        for a in aggregators:
+            self.register(a)
+
+    def register(self, aggregator):
+        if any(a.name == aggregator.name for a in self.aggregators):
+            raise ValueError('aggregator already registered: ' + aggregator.name)
+        self.aggregators.append(aggregator)
+        return aggregator
+
+    def projection(self):
+        # Only the fields the aggregators need are retrieved from mongo. A field
+        # is left out if one of its parents is already projected, since mongo
+        # refuses projections with colliding paths
+        fields = set(f for a in self.aggregators for f in a.fields)
+        projection = {'_id': 0}
+        for f in fields:
+            parts = f.split('.')
+            if not any('.'.join(parts[:i]) in fields for i in range(1, len(parts))):
+                projection[f] = 1
+        return projection
+
+    def consume(self, tweets):
+        # Feed every tweet to every aggregator, in one pass over 'tweets'
+        total = 0
+        aggregators = self.aggregators
+        for t in tweets:
+            total += 1
+            for a in aggregators:
+                a.add(t)
+        results = Results(total)
+        for a in aggregators:
+            results[a.name] = a.result()
+        return results
+
+    def run(self, collection, query=None):
+        return self.consume(collection.find(query or {}, self.projection()))
+
+
+def merge_partial(a, b):
+    # Result of one aggregator over two disjoint sets of tweets: Counters are
+    # added (keeping the zero counts), dicts of Counters are added by key and
+    # the sketches use their own merge
+    if isinstance(a, Counter):
+        merged = Counter(a)
+        merged.update(b)
+        return merged
+    if isinstance(a, dict):
+        merged = defaultdict(Counter)
+        for part in (a, b):
+            for key, counter in part.items():
+                merged[key].update(counter)
+        return merged
+    if hasattr(a, 'merge'):
+        return a.merge(b)
+    raise TypeError("can't merge results of type " + type(a).__name__)
+
+
+def merge_results(parts, empty=None):
+    # Results of the same aggregators run over disjoint sets of tweets (time
+    # partitions, _id ranges...) as if they were computed in one pass. empty is
+    # returned when there are no parts, e.g. the results of the engine over no
+    # tweets so every aggregator has its (empty) counts
+    merged = None
+    for part in parts:
+        if merged is None:
+            merged = Results(part.total)
+            merged.update(part)
+            continue
+        merged.total += part.total
+        for name, value in part.items():
+            merged[name] = merge_partial(merged[name], value) if name in merged else value
+    if merged is None:
+        return empty if empty is not None else Results()
+    return merged
+
+
+def default_engine():
+    # Aggregators used for the charts of the labs
+    return AnalysisEngine([LanguageCounter(), TypeCounter(), HashtagCounter(),
+                           CountryCounter(), MentionCounter(), HashtagByCountry()])
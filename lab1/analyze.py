@@ -1,91 +1,113 @@
 # -*- coding: utf-8 -*-
-from __future__ import division
+from __future__ import division, print_function
 from pymongo import MongoClient
 import matplotlib.pyplot as plt
 from collections import Counter
 import numpy as np
 import operator
-
-# Establish connection with database
-client = MongoClient()
-db = client.test
-col = db.twitterBrazil
+from datetime import datetime, timedelta
+from pipelines import get_backend
+from partitions import BUCKET, PartitionBackend, Partitions
+from parallelscan import ParallelBackend
+from analysis import default_engine
+from sketches import add_sketches, sketch_accuracy
 
 #######################################################
-# Retrieve data from the mongodb database, choosing
-# the fields you'll need afterwards
+# Choose how the tweets are counted: 'server' uses
+# aggregation pipelines so only the top rows leave
+# mongo, 'client' reads the tweets once and counts
+# them in python. Both give the same results.
+# 'rollup' reads the counters that stream.py keeps
+# while storing the tweets. 'parallel' counts in
+# python like 'client', reading _id ranges of the
+# collection in a process per core. 'partitions'
+# counts the tweets of the last LAST_HOURS in the
+# partitions stream.py writes when partitions.BUCKET
+# is set, reading several of them at a time
 #######################################################
-my_tweets = db.twitterBrazil.find({},{'lang':1, '_id':0, 'text':1, 'entities.hashtags':1,
-'in_reply_to_status_id':1, 'is_quote_status':1, 'retweeted_status':1, 'user.screen_name':1})
-numTweets = db.twitterBrazil.count()
+BACKEND = 'partitions' if BUCKET is not None else 'server'
+LAST_HOURS = 6
+# Also count the hashtags and mentions with the bounded memory sketches of
+# sketches.py (SKETCH_SIZE values each) and print how far their top 15 is
+# from the exact counts
+SKETCHES = False
+SKETCH_SIZE = 1000
+
+
+def main():
+    # Establish connection with database
+    client = MongoClient()
+    db = client.test
+    col = db.twitterBrazil
+
+    if BACKEND == 'parallel':
+        backend = ParallelBackend('mongodb://localhost', db.name, col.name)
+    elif BACKEND == 'partitions':
+        backend = PartitionBackend(Partitions(db, col.name, BUCKET or 'day'),
+                                   start=datetime.utcnow() - timedelta(hours=LAST_HOURS))
+    else:
+        backend = get_backend(col, BACKEND)
+    types = dict(backend.types())
+    numTweets = sum(types.values())
 
-####################################################
-# Plot of Languages (autodetected by Twitter)
-####################################################
-langsList = []
-for t in my_tweets:
-	langsList.append(t['lang'])
+    ####################################################
+    # Plot of Languages (autodetected by Twitter)
+    ####################################################
+    D = dict(backend.languages())
+    # ----------- Bar Plot ------------------------
+    plt.bar(range(len(D)), list(D.values()), align='center')
+    plt.xticks(range(len(D)), list(D.keys()))
+    plt.title('Languages spoken in the tweets captured')
+    plt.show()
 
-D = Counter(langsList)
-# ----------- Bar Plot ------------------------
-plt.bar(range(len(D)), D.values(), align='center')
-plt.xticks(range(len(D)), D.keys())
-plt.title('Languages spoken in the tweets captured')
-plt.show()
+    ##############################################################
+    # Plot how many of them are retweets, replies,
+    # quotations or original tweets
+    ##############################################################
+    retweets = types['retweet']
+    replies = types['reply']
+    quotations = types['quote_status']
+    originals = types['original']
 
-##############################################################
-# Plot how many of them are retweets, replies,
-# quotations or original tweets
-##############################################################
-my_tweets.rewind() #Reset cursor
-retweets = 0
-replies = 0
-quotations = 0
-originals = 0
-for t in my_tweets:
-	if t.get('retweeted_status') is not None:
-		retweets=retweets+1
-	elif t['is_quote_status'] is not False:
-		quotations = quotations+1
-	elif t.get('in_reply_to_status_id') is not None:
-		replies = replies+1
-	else:
-		originals = originals+1
+    # ----------- Pie Chart ------------------------
+    labels = 'Original Content', 'Retweets', 'Quotations', 'Replies'
+    sizes = [originals, retweets, quotations, replies]
+    frequencies = [x/numTweets if numTweets else 0 for x in sizes]
+    colors = ['gold', 'yellowgreen', 'lightcoral', 'lightskyblue']
+    explode = (0.1, 0, 0, 0)  # explode 1st slice
+    # Plot, there is no pie without tweets
+    if numTweets:
+        plt.pie(sizes, explode=explode, labels=labels, colors=colors,
+                autopct='%1.1f%%', shadow=True, startangle=140)
+        plt.axis('equal')
+        plt.title('Percentage of Tweets depending on how the content is generated')
+        plt.show()
 
-# ----------- Pie Chart ------------------------
-labels = 'Original Content', 'Retweets', 'Quotations', 'Replies'
-sizes = [originals, retweets, quotations, replies]
-frequencies = [x/numTweets for x in sizes]
-colors = ['gold', 'yellowgreen', 'lightcoral', 'lightskyblue']
-explode = (0.1, 0, 0, 0)  # explode 1st slice
-# Plot
-plt.pie(sizes, explode=explode, labels=labels, colors=colors,
-		autopct='%1.1f%%', shadow=True, startangle=140)
-plt.axis('equal')
-plt.title('Percentage of Tweets depending on how the content is generated')
-plt.show()
 
+    ##################################################################
+    # Plot secondary hashtags
+    ##################################################################
+    sorted_subset = sorted(backend.hashtags(15), key=operator.itemgetter(1))
 
-##################################################################
-# Plot secondary hashtags
-##################################################################
-my_tweets.rewind()
-hashList = []
-for t in my_tweets:
-    for e in t['entities']['hashtags']:
-        h = e['text']
-        hashList.append(h)
-D = Counter(hashList)
-subset = dict(D.most_common(15))
-sorted_subset = sorted(subset.iteritems(), key=operator.itemgetter(1))
+    # ----------- Horizontal Bar Plot ------------------------
+    pos = range(len(sorted_subset))
+    plt.barh(pos, [val[1] for val in sorted_subset], align = 'center', color = 'yellowgreen')
+    plt.yticks(pos, [val[0] for val in sorted_subset])
+    plt.title('Top 15 of hashtags captured')
+    plt.tight_layout()
+    plt.show()
 
-# ----------- Horizontal Bar Plot ------------------------
-pos = range(len(sorted_subset))
-plt.barh(pos, [val[1] for val in sorted_subset], align = 'center', color = 'yellowgreen')
-plt.yticks(pos, [val[0] for val in sorted_subset])
-plt.title('Top 15 of hashtags captured')
-plt.tight_layout()
-plt.show()
 
+    ##################################################################
+    # Top hashtags and mentions of the sketches against the exact ones
+    ##################################################################
+    if SKETCHES:
+        results = add_sketches(default_engine(), SKETCH_SIZE).run(col)
+        for name, report in sorted(sketch_accuracy(results).items()):
+            print('%s: recall %.2f, max error %d, mean error %.1f, bound %.1f, %d exact values' % (
+                name, report['recall'], report['max_error'], report['mean_error'],
+                report['error_bound'], report['exact_values']))
 
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+from __future__ import print_function
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metrics import IngestMetrics
+from writer import enrich_batch, get_client, run_hooks, store_to
+
+#######################################################
+# asyncio ingest pipeline. The thread that reads the
+# stream only puts the raw payloads in a bounded queue
+# (submit), an event loop in a background thread parses
+# them and a write stage stores them in batches, with
+# the inserts running in an executor so parsing goes on
+# while mongo is busy. When the queue is full:
+#   block:       submit waits for a free slot, the
+#                slowness reaches the reader (and the
+#                socket) but no tweet is lost
+#   drop_newest: the new payload is dropped
+#   drop_oldest: the oldest payload in the queue is
+#                dropped to make room for the new one
+# Every drop is counted, see stats(). enrich(batch)
+# runs in the thread of the inserts, before them. With
+# partitions the tweets are stored in its time
+# partitions instead of in 'collection'. The counts,
+# the parse and write times and the queue depth are
+# kept in metrics (a metrics.IngestMetrics). If a
+# stage dies its error is raised by the next submit,
+# flush or close instead of leaving them waiting
+#######################################################
+
+POLICIES = ('block', 'drop_newest', 'drop_oldest')
+
+
+class _Marker(object):
+    #Goes through the stages behind the payloads queued before it, 'done' is
+    #set once the write stage has stored them
+
+    def __init__(self, stop=False):
+        self.stop = stop
+        self.done = threading.Event()
+
+
+class _RawQueue(asyncio.Queue):
+    #Queue of the raw payloads and the markers
+
+    def drop_oldest(self):
+        # Remove the oldest payload, False if there are only markers. The
+        # markers stay where they are, behind the payloads they wait for
+        for i, item in enumerate(self._queue):
+            if not isinstance(item, _Marker):
+                del self._queue[i]
+                return True
+        return False
+
+
+class IngestPipeline(object):
+
+    def __init__(self, collection, queue_size=10000, policy='block', batch_size=500,
+                 flush_interval=1.0, enrich=None, partitions=None, metrics=None):
+        if policy not in POLICIES:
+            raise ValueError('unknown policy %r, use one of %s' % (policy, ', '.join(POLICIES)))
+        self.collection = collection
+        self.queue_size = queue_size
+        self.policy = policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enrich = enrich
+        self.partitions = partitions
+        self.hooks = []
+        self.metrics = metrics if metrics is not None else IngestMetrics()
+        self._closed = False
+        # Markers sent and not done yet, and the error that stopped a stage
+        self._pending = set()
+        self._error = None
+        self._lock = threading.Lock()
+        # Free places in the raw queue, taken by submit and given back by the
+        # parse stage, so the reader thread can wait for them without the loop
+        self._slots = threading.Semaphore(queue_size)
+        self._executor = ThreadPoolExecutor(1)
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name='IngestPipeline')
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait()
+        self.metrics.watch_depth(self.queue_depth)
+
+    @classmethod
+    def for_host(cls, host, database, collection, **kwargs):
+        return cls(get_client(host)[database][collection], **kwargs)
+
+    def add_hook(self, hook):
+        # hook(batch) is called after every insert with the stored tweets, in
+        # the thread of the inserts
+        self.hooks.append(hook)
+
+    # Reader side -------------------------------------------------------
+
+    def submit(self, raw):
+        # Queue a raw payload of the stream, returns False if it was dropped
+        if self._closed:
+            raise ValueError('submit to a closed IngestPipeline')
+        self.metrics.received.inc()
+        self._check()
+        if self.policy == 'block':
+            # With a timeout so a stage that died is noticed
+            while not self._slots.acquire(timeout=0.5):
+                self._check()
+        elif not self._slots.acquire(False):
+            if self.policy == 'drop_newest':
+                self.metrics.dropped.inc()
+                return False
+            self._loop.call_soon_threadsafe(self._replace_oldest, raw)
+            return True
+        self._loop.call_soon_threadsafe(self._put, raw)
+        return True
+
+    def flush(self, timeout=None):
+        # Wait until everything submitted before has been stored, False if
+        # the timeout passed first
+        marker = self._send(_Marker())
+        done = marker.done.wait(timeout)
+        self._check()
+        return done
+
+    def close(self, timeout=None):
+        # Store what is queued and stop the loop. False if the timeout passed
+        # before that, the loop then goes on in its daemon thread
+        if self._closed:
+            return True
+        self._closed = True
+        try:
+            marker = self._send(_Marker(stop=True))
+            if not marker.done.wait(timeout):
+                return False
+        except RuntimeError:
+            self._shutdown()
+            raise
+        self._shutdown()
+        self._check()
+        return True
+
+    def _send(self, marker):
+        with self._lock:
+            self._check()
+            self._pending.add(marker)
+            self._loop.call_soon_threadsafe(self._raw.put_nowait, marker)
+        return marker
+
+    def _shutdown(self):
+        self._thread.join()
+        self._executor.shutdown()
+
+    def _check(self):
+        if self._error is not None:
+            raise RuntimeError('the ingest pipeline stopped: %r' % (self._error,)) from self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def queue_depth(self):
+        return self._raw.qsize()
+
+    @property
+    def inserted(self):
+        return self.metrics.inserted.value
+
+    @property
+    def duplicates(self):
+        return self.metrics.duplicates.value
+
+    @property
+    def errors(self):
+        return self.metrics.failed.value
+
+    def stats(self):
+        m = self.metrics
+        return {
+            'received': m.received.value,
+            'dropped': m.dropped.value,
+            'parsed': m.parsed.value,
+            'parse_errors': m.parse_errors.value,
+            'skipped': m.skipped.value,
+            'inserted': m.inserted.value,
+            'duplicates': m.duplicates.value,
+            'errors': m.failed.value,
+            'expired': m.expired.value,
+            'batches': m.batches.value,
+            'queue_depth': self.queue_depth(),
+            'max_queue_depth': m.max_depth.value,
+            'queue_size': self.queue_size,
+            'policy': self.policy,
+        }
+
+    # Loop side ---------------------------------------------------------
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._raw = _RawQueue()
+        self._docs = asyncio.Queue(self.queue_size)
+        tasks = [self._loop.create_task(stage) for stage in (self._parse(), self._write())]
+        for task in tasks:
+            task.add_done_callback(self._stage_done)
+        self._ready.set()
+        self._loop.run_forever()
+        # A stage is still waiting if the other one died
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self._loop.close()
+
+    def _stage_done(self, task):
+        # A stage that ends with an error stops the pipeline, and whoever is
+        # waiting for a marker is woken up to see the error
+        if task.cancelled() or task.exception() is None:
+            return
+        with self._lock:
+            self._error = task.exception()
+            for marker in self._pending:
+                marker.done.set()
+            self._pending.clear()
+        print('ingest pipeline stopped: %r' % (self._error,))
+        self._loop.stop()
+
+    def _done(self, marker):
+        with self._lock:
+            self._pending.discard(marker)
+        marker.done.set()
+
+    def _put(self, raw):
+        self._raw.put_nowait(raw)
+        self.metrics.observe_depth(self._raw.qsize())
+
+    def _replace_oldest(self, raw):
+        # The queue was full when the payload arrived. The parse stage may
+        # have freed a slot since then, otherwise the oldest payload goes
+        if self._slots.acquire(False):
+            self._put(raw)
+            return
+        self.metrics.dropped.inc()
+        if self._raw.drop_oldest():
+            # The new payload takes the slot of the dropped one
+            self._put(raw)
+
+    async def _parse(self):
+        while True:
+            raw = await self._raw.get()
+            if isinstance(raw, _Marker):
+                await self._docs.put(raw)
+                if raw.stop:
+                    return
+                continue
+            self._slots.release()
+            try:
+                with self.metrics.parse_seconds.time():
+                    doc = json.loads(raw)
+            except ValueError:
+                self.metrics.parse_errors.inc()
+                continue
+            # Limit and delete notices are not tweets
+            if 'created_at' not in doc or 'user' not in doc:
+                self.metrics.skipped.inc()
+                continue
+            self.metrics.parsed.inc()
+            await self._docs.put(doc)
+
+    async def _write(self):
+        loop = self._loop
+        while True:
+            # Wait for the first document, then fill the batch until it is
+            # full, the flush interval passes or a marker arrives
+            item = await self._docs.get()
+            deadline = loop.time() + self.flush_interval
+            batch = []
+            while not isinstance(item, _Marker):
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    item = None
+                    break
+                if not self._docs.empty():
+                    item = self._docs.get_nowait()
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    item = None
+                    break
+                try:
+                    item = await asyncio.wait_for(self._docs.get(), remaining)
+                except asyncio.TimeoutError:
+                    # A document may have arrived as the wait timed out
+                    if not self._docs.empty():
+                        item = self._docs.get_nowait()
+                        continue
+                    item = None
+                    break
+            if batch:
+                await loop.run_in_executor(self._executor, self._store, batch)
+            if isinstance(item, _Marker):
+                self._done(item)
+                if item.stop:
+                    loop.stop()
+                    return
+
+    def _store(self, batch):
+        enrich_batch(self.enrich, batch)
+        with self.metrics.write_seconds.time():
+            inserted, duplicates, errors, expired, stored = store_to(self.collection, self.partitions, batch)
+        self.metrics.stored(inserted, duplicates, errors, expired)
+        run_hooks(self.hooks, stored)
+
+
+class PipelineListener(object):
+    #Stream listener that only queues the payloads, for replay.ReplaySource or,
+    #mixed with tweepy.StreamListener (stream.QueueListener), for tweepy.Stream
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def on_data(self, data):
+        self.pipeline.submit(data)
+        return True
+
+    def on_disconnect(self, notice):
+        self.pipeline.flush()
@@ -0,0 +1,142 @@
+from __future__ import print_function, division
+import argparse
+import json
+import sys
+import time
+from asyncingest import POLICIES, IngestPipeline, PipelineListener
+from indexes import ensure_indexes
+from localmongo import LocalMongo
+from replay import ReplaySource, read_ndjson, synthetic_ndjson
+from rollups import RollupUpdater
+from stream import StreamListener
+from writer import MongoWriter
+
+#######################################################
+# Ingest benchmark: replays tweets through the stream
+# listener and the writer into mongo and reports the
+# tweets per second, the latency of on_data and the
+# latency of the inserts. Without --host a temporary
+# mongod is used
+#######################################################
+
+
+class TimedCollection(object):
+    #Wraps the collection of the writer to time every insert_many
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.times = []
+
+    def insert_many(self, docs, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.collection.insert_many(docs, **kwargs)
+        finally:
+            self.times.append(time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def bench(host, args):
+    if args.pipeline == 'async':
+        writer = IngestPipeline.for_host(host, args.db, args.collection, queue_size=args.queue_size,
+                                         policy=args.policy, batch_size=args.batch_size,
+                                         flush_interval=args.flush_interval)
+        listener = PipelineListener(writer)
+    else:
+        writer = MongoWriter(host, args.db, args.collection, args.batch_size, args.flush_interval)
+        listener = StreamListener(writer)
+    writer.collection.drop()
+    if not args.no_indexes:
+        ensure_indexes(writer.collection)
+    timed = TimedCollection(writer.collection)
+    writer.collection = timed
+    if args.rollups:
+        writer.add_hook(RollupUpdater(timed.collection, bucket='hour'))
+    if args.file:
+        lines = read_ndjson(args.file)
+    else:
+        lines = synthetic_ndjson(args.tweets, args.seed)
+    source = ReplaySource(listener, lines, rate=args.rate, record_latency=True)
+
+    start = time.perf_counter()
+    source.run()
+    writer.close()
+    total = time.perf_counter() - start
+
+    stored = timed.collection.count_documents({})
+    extra = {}
+    if args.pipeline == 'async':
+        stats = writer.stats()
+        extra = {'dropped': stats['dropped'], 'max_queue_depth': stats['max_queue_depth']}
+    ms = 1000.0
+    report = {
+        'tweets': source.count,
+        'stored': stored,
+        'seconds': total,
+        'tweets_per_second': stored / total if total else 0.0,
+        'on_data_p50_ms': percentile(source.latencies, 50) * ms,
+        'on_data_p99_ms': percentile(source.latencies, 99) * ms,
+        'inserts': len(timed.times),
+        'insert_p50_ms': percentile(timed.times, 50) * ms,
+        'insert_p99_ms': percentile(timed.times, 99) * ms,
+        'batch_size': args.batch_size,
+        'rollups': args.rollups,
+        'indexes': not args.no_indexes,
+        'duplicates': writer.duplicates,
+        'pipeline': args.pipeline,
+        'metrics': writer.metrics.registry.snapshot(),
+    }
+    report.update(extra)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', help='mongo uri, by default a temporary mongod is used')
+    parser.add_argument('--db', default='bench')
+    parser.add_argument('--collection', default='tweets')
+    parser.add_argument('--file', help='ndjson capture to replay, by default fake tweets are used')
+    parser.add_argument('--tweets', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rate', type=float, help='tweets per second, by default as fast as possible')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--flush-interval', type=float, default=1.0)
+    parser.add_argument('--rollups', action='store_true', help='also update the rollups')
+    parser.add_argument('--pipeline', choices=['writer', 'async'], default='writer',
+                        help='MongoWriter in the listener or the asyncio pipeline')
+    parser.add_argument('--queue-size', type=int, default=10000, help='async pipeline queue size')
+    parser.add_argument('--policy', choices=POLICIES, default='block',
+                        help='async pipeline policy when the queue is full')
+    parser.add_argument('--no-indexes', action='store_true', help="don't create the indexes first")
+    parser.add_argument('--json', action='store_true', help='print the report as json')
+    args = parser.parse_args()
+
+    if args.host:
+        report = bench(args.host, args)
+    else:
+        with LocalMongo() as mongo:
+            report = bench(mongo.uri, args)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print('%(stored)d of %(tweets)d tweets stored in %(seconds).2fs: '
+              '%(tweets_per_second).0f tweets/s' % report)
+        print('on_data  p50 %(on_data_p50_ms).3fms  p99 %(on_data_p99_ms).3fms' % report)
+        print('inserts  %(inserts)d  p50 %(insert_p50_ms).2fms  p99 %(insert_p99_ms).2fms' % report)
+        if 'dropped' in report:
+            print('dropped  %(dropped)d  max queue depth %(max_queue_depth)d' % report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
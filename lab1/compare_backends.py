@@ -0,0 +1,65 @@
+from __future__ import print_function
+import argparse
+import sys
+import time
+from pymongo import MongoClient
+from localmongo import LocalMongo
+from pipelines import ServerBackend, ClientBackend, compare
+from synthetic import generate_tweets
+
+#######################################################
+# Checks that the server side pipelines give the same
+# counts as the client side engine and times both.
+# Without --host a temporary mongod is started and
+# filled with fake tweets
+#######################################################
+
+COUNTRIES = ['United States', 'Venezuela', 'Brasil']
+HASHTAGS = ['SomosTodosAllan', '5Nov', 'DebateElectoral']
+USERS = ['NicolasMaduro']
+
+
+def timed(backend):
+    start = time.time()
+    backend.languages(15)
+    backend.types()
+    backend.hashtags(15)
+    backend.countries(15)
+    backend.mentions(15)
+    return time.time() - start
+
+
+def check(collection, n):
+    mismatches = compare(collection, n, COUNTRIES, HASHTAGS, USERS)
+    for query, server, client in mismatches:
+        print('Mismatch in ' + query)
+        print('  server: ' + repr(server))
+        print('  client: ' + repr(client))
+    print('server: %.3fs  client: %.3fs' % (timed(ServerBackend(collection)),
+                                            timed(ClientBackend(collection))))
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', help='mongo uri, by default a temporary mongod is used')
+    parser.add_argument('--db', default='test')
+    parser.add_argument('--collection', default='twitterBrazil')
+    parser.add_argument('--tweets', type=int, default=20000,
+                        help='fake tweets to insert in the temporary mongod')
+    parser.add_argument('-n', type=int, default=15)
+    args = parser.parse_args()
+
+    if args.host:
+        ok = check(MongoClient(args.host)[args.db][args.collection], args.n)
+    else:
+        with LocalMongo() as mongo:
+            collection = mongo.client()[args.db][args.collection]
+            collection.insert_many(generate_tweets(args.tweets))
+            ok = check(collection, args.n)
+    print('OK' if ok else 'FAILED')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
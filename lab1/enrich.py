@@ -0,0 +1,155 @@
+from __future__ import print_function
+import argparse
+import hashlib
+import sys
+from collections import OrderedDict
+from multiprocessing import Pool
+from langdetect import DetectorFactory, detect
+from pymongo import MongoClient, UpdateOne
+from analysis import full_text, tweet_type
+
+#######################################################
+# Fields derived from every tweet when it is stored,
+# so the analysis doesn't compute them again from the
+# raw document on every run:
+#   tweet_type:    original, retweet, quote_status, reply
+#   full_text:     the text without the 140 chars cut
+#   detected_lang: language detected by langdetect
+# The type and the text are cheap and computed in the
+# writer thread, the languages of the distinct texts of
+# the batch are detected in a pool of processes. The
+# writers call the enricher before the insert, and
+# enrich_collection fills the fields of tweets stored
+# before
+#######################################################
+
+FIELDS = ('tweet_type', 'full_text', 'detected_lang')
+UNDEFINED = 'und'
+
+
+# Same detection as lab2/langdetection.py, so the languages stored here are the
+# ones the lab2 analysis would detect: langdetect is random unless it is seeded,
+# and it fails on texts without letters
+def seed_langdetect(seed):
+    DetectorFactory.seed = seed
+
+
+def detect_lang(text):
+    try:
+        return detect(text)
+    except Exception:
+        return UNDEFINED
+
+
+class Enricher(object):
+    #Callable that adds FIELDS to the tweets of a batch, in place. detect_langs=False
+    #leaves detected_lang out. The languages of the last cache_size distinct
+    #texts are kept, most tweets are retweets of a few texts
+
+    def __init__(self, processes=None, detect_langs=True, seed=0, cache_size=100000, chunksize=64):
+        self.processes = processes
+        self.detect_langs = detect_langs
+        self.seed = seed
+        self.cache_size = cache_size
+        self.chunksize = chunksize
+        self.enriched = 0
+        self.detected = 0
+        self._cache = OrderedDict()
+        self._pool = None
+
+    def __call__(self, batch):
+        self.enrich(batch)
+
+    def enrich(self, batch):
+        for t in batch:
+            t['tweet_type'] = tweet_type(t)
+            t['full_text'] = full_text(t)
+        if self.detect_langs:
+            langs = self.languages([t['full_text'] for t in batch])
+            for t, lang in zip(batch, langs):
+                t['detected_lang'] = lang
+        self.enriched += len(batch)
+        return batch
+
+    def languages(self, texts):
+        cache = self._cache
+        keys = [hashlib.sha1(t.encode('utf-8')).digest() for t in texts]
+        missing = OrderedDict()
+        for k, t in zip(keys, texts):
+            if k in cache:
+                cache.move_to_end(k)
+            elif k not in missing:
+                missing[k] = t
+        if missing:
+            found = self._detect(list(missing.values()))
+            self.detected += len(found)
+            cache.update(zip(missing, found))
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return [cache[k] for k in keys]
+
+    def _detect(self, texts):
+        if self.processes == 1 or len(texts) < self.chunksize:
+            seed_langdetect(self.seed)
+            return [detect_lang(t) for t in texts]
+        if self._pool is None:
+            self._pool = Pool(self.processes, initializer=seed_langdetect, initargs=(self.seed,))
+        return self._pool.map(detect_lang, texts, chunksize=self.chunksize)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+
+# Fields of the raw tweet the enricher reads
+SOURCE_PROJECTION = {'text': 1, 'extended_tweet.full_text': 1, 'retweeted_status.id': 1,
+                     'retweeted_status.extended_tweet.full_text': 1, 'is_quote_status': 1,
+                     'in_reply_to_status_id': 1}
+
+
+def enrich_collection(collection, enricher, batch_size=1000):
+    # Add the fields to the tweets stored without them. Returns how many
+    # tweets were updated
+    updated = 0
+    query = {'tweet_type': {'$exists': False}}
+    batch = []
+    for t in collection.find(query, SOURCE_PROJECTION, batch_size=batch_size):
+        batch.append(t)
+        if len(batch) == batch_size:
+            updated += _update(collection, enricher, batch)
+            batch = []
+    if batch:
+        updated += _update(collection, enricher, batch)
+    return updated
+
+
+def _update(collection, enricher, batch):
+    enricher.enrich(batch)
+    ops = [UpdateOne({'_id': t['_id']}, {'$set': dict((f, t[f]) for f in FIELDS if f in t)})
+           for t in batch]
+    return collection.bulk_write(ops, ordered=False).modified_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='add the derived fields to the tweets stored without them')
+    parser.add_argument('collections', nargs='+')
+    parser.add_argument('--host', default='mongodb://localhost')
+    parser.add_argument('--db', default='lab1')
+    parser.add_argument('--processes', type=int, help='language detection processes, by default all the cores')
+    parser.add_argument('--no-lang', action='store_true', help="don't detect the language")
+    args = parser.parse_args()
+
+    db = MongoClient(args.host)[args.db]
+    enricher = Enricher(args.processes, detect_langs=not args.no_lang)
+    try:
+        for name in args.collections:
+            print('%s: %d tweets enriched' % (name, enrich_collection(db[name], enricher)))
+    finally:
+        enricher.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
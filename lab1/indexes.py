@@ -0,0 +1,147 @@
+from __future__ import print_function
+import argparse
+import sys
+from pymongo import ASCENDING, IndexModel, MongoClient
+
+#######################################################
+# Indexes of the tweet collections. The fields used to
+# filter and group the tweets are indexed so the
+# queries don't scan the whole collection, and the
+# tweet id is unique so the tweets that twitter sends
+# again after a reconnection are not stored twice
+# (the writer counts them as duplicates)
+#######################################################
+
+INDEXES = [
+    IndexModel([('entities.hashtags.text', ASCENDING)], name='hashtags'),
+    IndexModel([('entities.user_mentions.screen_name', ASCENDING)], name='mentions'),
+    IndexModel([('place.country', ASCENDING)], name='country'),
+    IndexModel([('lang', ASCENDING)], name='lang'),
+    IndexModel([('created_at', ASCENDING)], name='created_at'),
+    # Only documents with an id, the stream also sends notices without one
+    IndexModel([('id', ASCENDING)], name='tweet_id', unique=True,
+               partialFilterExpression={'id': {'$exists': True}}),
+]
+
+# Index that covers each single field query, see covering_index
+FIELD_INDEXES = dict((list(m.document['key'])[0], m.document['name']) for m in INDEXES)
+
+
+def duplicate_ids(collection):
+    # Tweet ids stored more than once, the unique index can't be built with them
+    pipeline = [
+        {'$match': {'id': {'$exists': True}}},
+        {'$group': {'_id': '$id', 'count': {'$sum': 1}, 'docs': {'$push': '$_id'}}},
+        {'$match': {'count': {'$gt': 1}}},
+    ]
+    return list(collection.aggregate(pipeline, allowDiskUse=True))
+
+
+def remove_duplicates(collection):
+    # Keep the first copy of every tweet, returns the number of removed ones
+    removed = 0
+    for dup in duplicate_ids(collection):
+        removed += collection.delete_many({'_id': {'$in': sorted(dup['docs'])[1:]}}).deleted_count
+    return removed
+
+
+def conflicting_indexes(collection, model):
+    # Indexes of the collection with the name or the keys of 'model' but other
+    # options, mongo doesn't build both
+    name, key = model.document['name'], index_spec(model.document)[0]
+    return [n for n, info in collection.index_information().items()
+            if n != '_id_' and (n == name or index_spec(info)[0] == key)]
+
+
+def ensure_indexes(collection, dedupe=False, replace=False):
+    # Create the indexes that are missing. With dedupe the copies of a tweet
+    # are removed first, otherwise the unique index fails if there are any.
+    # A missing index that conflicts with an existing one is only created with
+    # replace, which drops the existing one first
+    if dedupe:
+        removed = remove_duplicates(collection)
+        if removed:
+            print('%d duplicated tweets removed from %s' % (removed, collection.name))
+    names = missing_indexes(collection)
+    missing = []
+    for m in INDEXES:
+        if m.document['name'] not in names:
+            continue
+        conflicts = conflicting_indexes(collection, m)
+        if conflicts and not replace:
+            print('%s: index %s not created, it conflicts with %s, indexes.py --replace drops it'
+                  % (collection.name, m.document['name'], ', '.join(conflicts)))
+            continue
+        for name in conflicts:
+            print('%s: dropping index %s, replaced by %s' % (collection.name, name, m.document['name']))
+            collection.drop_index(name)
+        missing.append(m)
+    if missing:
+        collection.create_indexes(missing)
+    return [m.document['name'] for m in missing]
+
+
+# Options that change what an index does, the rest (the name, the version...)
+# don't matter when comparing two of them
+SPEC_OPTIONS = (('unique', False), ('sparse', False), ('partialFilterExpression', None),
+                ('expireAfterSeconds', None))
+
+
+def index_spec(info):
+    # Keys and options of an index, from index_information() or the document
+    # of an IndexModel
+    key = info['key']
+    key = tuple(key.items()) if hasattr(key, 'items') else tuple(key)
+    return (key,) + tuple(info.get(option, default) for option, default in SPEC_OPTIONS)
+
+
+def missing_indexes(collection):
+    # Names of the indexes of INDEXES that the collection doesn't have with the
+    # same keys and options
+    existing = [index_spec(info) for info in collection.index_information().values()]
+    return [m.document['name'] for m in INDEXES if index_spec(m.document) not in existing]
+
+
+def covering_index(collection, field):
+    # Name of the index on 'field' if the collection has it. A query that only
+    # filters and returns that field (without _id) is answered from the index
+    name = FIELD_INDEXES.get(field)
+    if name is not None and name not in missing_indexes(collection):
+        return name
+    return None
+
+
+def count_tweets(collection):
+    # From the collection metadata instead of counting every document
+    return collection.estimated_document_count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='create and check the indexes of the tweet collections')
+    parser.add_argument('collections', nargs='+')
+    parser.add_argument('--host', default='mongodb://localhost')
+    parser.add_argument('--db', default='lab1')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='remove duplicated tweets before creating the unique index')
+    parser.add_argument('--replace', action='store_true',
+                        help='drop the indexes that conflict with a missing one')
+    parser.add_argument('--check', action='store_true', help='only report the missing indexes')
+    args = parser.parse_args()
+
+    db = MongoClient(args.host)[args.db]
+    status = 0
+    for name in args.collections:
+        collection = db[name]
+        if not args.check:
+            created = ensure_indexes(collection, args.dedupe, args.replace)
+            print('%s: created %s' % (name, ', '.join(created) or 'nothing'))
+        missing = missing_indexes(collection)
+        if missing:
+            status = 1
+        print('%s: %d tweets, missing indexes: %s' % (name, count_tweets(collection),
+                                                     ', '.join(missing) or 'none'))
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+from __future__ import division
+import numpy as np
+from analysis import Aggregator, country, hashtags, mentions
+
+#######################################################
+# In memory inverted indexes of the tweets, built in
+# the same single pass as the other aggregators. Every
+# tweet gets a position, and for each field (hashtag,
+# mention, country) the index keeps:
+#   forward:  the values of every tweet (tweet -> codes)
+#   postings: the sorted positions of the tweets of
+#             every value (value -> tweets)
+# both as int32 arrays in CSR layout. A query like
+# "mentions in the tweets with #5Nov" intersects the
+# postings of the conditions and counts the forward
+# values of the tweets left, without reading the
+# collection again
+#######################################################
+
+FIELDS = {
+    'hashtag': hashtags,
+    'mention': mentions,
+    'country': lambda t: [c for c in (country(t),) if c is not None],
+}
+
+
+def _csr_transpose(indptr, codes, size):
+    # value -> sorted positions of the tweets that have it (repeated when the
+    # tweet has the value more than once)
+    tweets = np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+    order = np.argsort(codes, kind='stable')
+    ptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=size), out=ptr[1:])
+    return ptr, tweets[order]
+
+
+class FieldIndex(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.values = []
+        self.codes = {}
+        self._forward = []
+        self._indptr = [0]
+        self.frozen = False
+
+    def add(self, keys):
+        codes = self.codes
+        for k in keys:
+            code = codes.get(k)
+            if code is None:
+                code = codes[k] = len(self.values)
+                self.values.append(k)
+            self._forward.append(code)
+        self._indptr.append(len(self._forward))
+
+    def freeze(self):
+        self.indptr = np.array(self._indptr, dtype=np.int64)
+        self.forward = np.array(self._forward, dtype=np.int32)
+        self.posting_ptr, self.postings = _csr_transpose(self.indptr, self.forward, len(self.values))
+        self._forward = self._indptr = None
+        self.frozen = True
+
+    def tweets(self, key, unique=True):
+        code = self.codes.get(key)
+        if code is None:
+            return np.zeros(0, dtype=np.int32)
+        found = self.postings[self.posting_ptr[code]:self.posting_ptr[code + 1]]
+        return np.unique(found) if unique else found
+
+    def count(self, positions=None):
+        # Occurrences of every value in the tweets at the given positions
+        # (all the tweets by default), as an array indexed by code
+        if positions is None:
+            codes = self.forward
+        else:
+            starts = self.indptr[positions]
+            lengths = self.indptr[positions + 1] - starts
+            # Positions in 'forward' of the values of every tweet
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            codes = self.forward[offsets + np.arange(lengths.sum())]
+        return np.bincount(codes, minlength=len(self.values))
+
+
+class InvertedIndex(Aggregator):
+    #Aggregator that builds the indexes, its result is the index itself
+
+    fields = ('entities.hashtags.text', 'entities.user_mentions.screen_name', 'place.country')
+
+    def __init__(self, name='index'):
+        super(InvertedIndex, self).__init__(name)
+        self.indexes = dict((f, FieldIndex(f)) for f in FIELDS)
+        self.total = 0
+
+    def add(self, t):
+        for f, index in self.indexes.items():
+            index.add(FIELDS[f](t))
+        self.total += 1
+
+    def result(self):
+        for index in self.indexes.values():
+            if not index.frozen:
+                index.freeze()
+        return self
+
+    @classmethod
+    def build(cls, tweets):
+        index = cls()
+        for t in tweets:
+            index.add(t)
+        return index.result()
+
+    def __getitem__(self, field):
+        return self.indexes[field]
+
+    def match(self, where):
+        # Sorted positions of the tweets that meet all the conditions, a list
+        # of (field, value)
+        positions = None
+        for field, key in where:
+            found = self.indexes[field].tweets(key)
+            positions = found if positions is None else \
+                np.intersect1d(positions, found, assume_unique=True)
+        return positions
+
+    def _counts(self, field, where, weighted):
+        positions = None
+        if where:
+            if weighted:
+                if len(where) != 1:
+                    raise ValueError('weighted counts need a single condition')
+                cond_field, key = where[0]
+                positions = self.indexes[cond_field].tweets(key, unique=False)
+            else:
+                positions = self.match(where)
+        return self.indexes[field].count(positions)
+
+    def count(self, field, where=None, weighted=False):
+        # Counts of the values of 'field' as {value: count}. where: only the
+        # tweets that meet the conditions. weighted: a tweet counts as many
+        # times as it has the (single) condition value, like HashtagsByMention
+        counts = self._counts(field, where, weighted)
+        values = self.indexes[field].values
+        return dict((values[c], int(counts[c])) for c in np.flatnonzero(counts))
+
+    def top(self, field, n=15, where=None, weighted=False):
+        # The n most common values as [(value, count)], most common first and
+        # in order of appearance when they tie
+        counts = self._counts(field, where, weighted)
+        n = min(n, np.count_nonzero(counts))
+        if n == 0:
+            return []
+        best = np.argpartition(-counts, n - 1)[:n]
+        best = best[np.lexsort((best, -counts[best]))]
+        values = self.indexes[field].values
+        return [(values[c], int(counts[c])) for c in best]
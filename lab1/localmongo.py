@@ -0,0 +1,71 @@
+from __future__ import print_function
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from pymongo import MongoClient
+
+#######################################################
+# Throwaway mongod for tests and benchmarks. It runs on
+# a free port with its data in a temporary directory
+# that is removed when it stops. The binary is taken
+# from the MONGOD environment variable or the PATH
+#######################################################
+
+
+def _free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class LocalMongo(object):
+
+    def __init__(self, mongod=None, port=None):
+        self.mongod = mongod or os.environ.get('MONGOD', 'mongod')
+        self.port = port or _free_port()
+        self.uri = 'mongodb://127.0.0.1:%d/' % self.port
+        self.dbpath = None
+        self.process = None
+
+    def start(self, timeout=30):
+        self.dbpath = tempfile.mkdtemp(prefix='mongod-')
+        self.process = subprocess.Popen(
+            [self.mongod, '--dbpath', self.dbpath, '--port', str(self.port),
+             '--bind_ip', '127.0.0.1', '--quiet'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+        client = MongoClient(self.uri, serverSelectionTimeoutMS=500)
+        deadline = time.time() + timeout
+        while True:
+            try:
+                client.admin.command('ping')
+                break
+            except Exception:
+                if self.process.poll() is not None or time.time() > deadline:
+                    self.stop()
+                    raise RuntimeError('mongod did not start on port %d' % self.port)
+                time.sleep(0.2)
+        client.close()
+        return self
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+            self.process = None
+        if self.dbpath is not None:
+            shutil.rmtree(self.dbpath, ignore_errors=True)
+            self.dbpath = None
+
+    def client(self):
+        return MongoClient(self.uri)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,275 @@
+from __future__ import print_function
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#######################################################
+# Metrics of the ingest path, without dependencies:
+#   counters:   tweets received, parsed, inserted...
+#   histograms: JSON parse time, mongo write latency
+#   gauges:     tweets waiting in the buffer/queue
+# The writers update them as they go, and they are
+# read as the Prometheus text format from a local
+# http endpoint (MetricsServer, /metrics) or written
+# every few seconds to a json file (StatsFile)
+#######################################################
+
+# Seconds, from a fast json.loads to a slow insert_many
+LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05,
+                   0.1, 0.5, 1.0, 5.0)
+
+
+class Counter(object):
+
+    kind = 'counter'
+
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def samples(self):
+        return [(self.name, self.value)]
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(object):
+    #A value that goes up and down. With fn the value is fn() at the moment
+    #it is read, for things like the depth of a queue
+
+    kind = 'gauge'
+
+    def __init__(self, name, description, fn=None):
+        self.name = name
+        self.description = description
+        self.fn = fn
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self.fn() if self.fn is not None else self._value
+
+    def samples(self):
+        return [(self.name, self.value)]
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram(object):
+    #Counts of the observed values in cumulative buckets, plus their sum
+
+    kind = 'histogram'
+
+    def __init__(self, name, description, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        # Upper bound of the bucket of the q quantile, None without values
+        # (or inf if it is past the last bucket)
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        with self._lock:
+            counts, total, sum_ = list(self.counts), self.count, self.sum
+        samples, cumulative = [], 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            samples.append(('%s_bucket{le="%s"}' % (self.name, _format(bound)), cumulative))
+        samples.append((self.name + '_sum', sum_))
+        samples.append((self.name + '_count', total))
+        return samples
+
+    def snapshot(self):
+        return {'count': self.count, 'sum': self.sum,
+                'p50': self.quantile(0.5), 'p99': self.quantile(0.99)}
+
+
+class _Timer(object):
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.metrics = []
+
+    def _add(self, metric):
+        if any(m.name == metric.name for m in self.metrics):
+            raise ValueError('metric already registered: ' + metric.name)
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, description):
+        return self._add(Counter(name, description))
+
+    def gauge(self, name, description, fn=None):
+        return self._add(Gauge(name, description, fn))
+
+    def histogram(self, name, description, buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, description, buckets))
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+        for m in self.metrics:
+            lines.append('# HELP %s %s' % (m.name, m.description))
+            lines.append('# TYPE %s %s' % (m.name, m.kind))
+            for name, value in m.samples():
+                lines.append('%s %s' % (name, _format(value)))
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        return dict((m.name, m.snapshot()) for m in self.metrics)
+
+
+class IngestMetrics(object):
+    #The metrics of one writer (writer.MongoWriter or asyncingest.IngestPipeline)
+
+    def __init__(self, registry=None, prefix='ingest'):
+        self.registry = registry if registry is not None else Registry()
+        r, p = self.registry, prefix
+        self.received = r.counter(p + '_tweets_received_total', 'Payloads received from the stream')
+        self.parsed = r.counter(p + '_tweets_parsed_total', 'Tweets decoded from json')
+        self.parse_errors = r.counter(p + '_parse_errors_total', 'Payloads that were not valid json')
+        self.skipped = r.counter(p + '_skipped_total', 'Payloads that were not tweets (limit and delete notices)')
+        self.inserted = r.counter(p + '_tweets_inserted_total', 'Tweets stored in mongo')
+        self.duplicates = r.counter(p + '_tweets_duplicated_total', 'Tweets already stored')
+        self.failed = r.counter(p + '_tweets_failed_total', 'Tweets that could not be stored')
+        self.dropped = r.counter(p + '_tweets_dropped_total', 'Tweets dropped because the queue was full')
+        self.expired = r.counter(p + '_tweets_expired_total', 'Tweets not stored because they were older than the retention')
+        self.batches = r.counter(p + '_batches_total', 'Batches written to mongo')
+        self.parse_seconds = r.histogram(p + '_parse_seconds', 'Time to decode the json of a tweet')
+        self.write_seconds = r.histogram(p + '_write_seconds', 'Time to store a batch in mongo')
+        self.depth = r.gauge(p + '_buffer_depth', 'Tweets waiting to be stored')
+        self.max_depth = r.gauge(p + '_buffer_max_depth', 'Largest number of tweets waiting so far')
+
+    def stored(self, inserted, duplicates, errors, expired=0):
+        # Result of writer.store_to
+        self.inserted.inc(inserted)
+        self.duplicates.inc(duplicates)
+        self.failed.inc(errors)
+        self.expired.inc(expired)
+        self.batches.inc()
+
+    def watch_depth(self, depth):
+        # depth() is read every time the gauges are
+        self.depth.fn = depth
+
+    def observe_depth(self, depth):
+        if depth > self.max_depth.value:
+            self.max_depth.set(depth)
+
+
+class MetricsServer(object):
+    #http://host:port/metrics with the metrics of a registry, in a daemon thread
+
+    def __init__(self, registry, port=9108, host='127.0.0.1'):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, name='MetricsServer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StatsFile(object):
+    #Writes the snapshot of a registry as json every 'interval' seconds. The
+    #file is replaced at once so a reader never sees half of it
+
+    def __init__(self, registry, path, interval=10.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='StatsFile')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self):
+        stats = self.registry.snapshot()
+        stats['time'] = time.time()
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(stats, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
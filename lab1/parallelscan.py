@@ -0,0 +1,151 @@
+from __future__ import print_function
+import argparse
+import copy
+import sys
+import time
+from multiprocessing import Pool, cpu_count
+from pymongo import MongoClient
+from analysis import AnalysisEngine, default_engine, merge_results
+from pipelines import ClientBackend
+
+#######################################################
+# Parallel scans of a tweet collection. The _id space
+# is split in ranges from a $sample of the ids, so the
+# ranges have about the same number of tweets, and each
+# range is read by a worker process with its own client
+# and the projection of the engine. Decoding the BSON
+# and counting happen in every process at the same
+# time, and the partial results of the ranges are
+# merged with analysis.merge_results. There are more
+# ranges than processes so a slow range doesn't leave
+# the others idle at the end
+#######################################################
+
+RANGES_PER_PROCESS = 4
+SAMPLE_PER_RANGE = 32
+
+
+def id_bounds(collection, parts, sample_per_range=SAMPLE_PER_RANGE):
+    # parts - 1 sorted _ids that split the collection in parts ranges of
+    # about the same size
+    if parts <= 1:
+        return []
+    sample = collection.aggregate([{'$sample': {'size': parts * sample_per_range}},
+                                   {'$project': {'_id': 1}}])
+    ids = sorted(set(d['_id'] for d in sample))
+    if not ids:
+        return []
+    bounds = [ids[len(ids) * i // parts] for i in range(1, parts)]
+    return sorted(set(bounds))
+
+
+def id_ranges(collection, parts, sample_per_range=SAMPLE_PER_RANGE):
+    # (low, high) ranges that cover every _id, low included and high
+    # excluded, None for the open ends
+    bounds = [None] + id_bounds(collection, parts, sample_per_range) + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def range_query(low, high, query=None):
+    match = {}
+    if low is not None:
+        match['$gte'] = low
+    if high is not None:
+        match['$lt'] = high
+    q = {'_id': match} if match else {}
+    if query:
+        q = {'$and': [q, query]} if q else query
+    return q
+
+
+# Client of every worker process, created in the process itself since a
+# MongoClient must not be shared across a fork
+_client = None
+
+
+def _init_worker(host):
+    global _client
+    _client = MongoClient(host)
+
+
+def _scan(task):
+    # The engine arrives pickled, with its own empty aggregators
+    database, name, engine, query, batch_size = task
+    collection = _client[database][name]
+    return engine.consume(collection.find(query, engine.projection(), batch_size=batch_size))
+
+
+def parallel_run(engine, host, database, collection, query=None, processes=None,
+                 parts=None, batch_size=1000):
+    # Same Results as engine.run(client[database][collection], query), read by
+    # 'processes' worker processes (all the cores by default) in 'parts' _id
+    # ranges. The aggregators of the engine must have mergeable results
+    processes = processes or cpu_count()
+    parts = parts or processes * RANGES_PER_PROCESS
+    client = MongoClient(host)
+    try:
+        ranges = id_ranges(client[database][collection], parts)
+    finally:
+        client.close()
+    tasks = [(database, collection, engine, range_query(low, high, query), batch_size)
+             for low, high in ranges]
+    pool = Pool(processes, initializer=_init_worker, initargs=(host,))
+    try:
+        return merge_results(pool.imap(_scan, tasks))
+    finally:
+        pool.close()
+        pool.join()
+
+
+class ParallelBackend(ClientBackend):
+    #ClientBackend that counts with parallel_run
+
+    def __init__(self, host, database, collection, processes=None):
+        self.host = host
+        self.database = database
+        self.name = collection
+        self.processes = processes
+        self._results = None
+
+    def _run(self, engine):
+        return parallel_run(engine, self.host, self.database, self.name, processes=self.processes)
+
+    def _default(self, name):
+        if self._results is None:
+            self._results = self._run(default_engine())
+        return self._results[name]
+
+    def _single(self, aggregator):
+        return self._run(AnalysisEngine([copy.deepcopy(aggregator)]))[aggregator.name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='time the analysis with one process and with parallel range scans')
+    parser.add_argument('collection')
+    parser.add_argument('--host', default='mongodb://localhost')
+    parser.add_argument('--db', default='lab1')
+    parser.add_argument('--processes', type=int, nargs='+', default=[cpu_count()])
+    args = parser.parse_args()
+
+    collection = MongoClient(args.host)[args.db][args.collection]
+    start = time.time()
+    expected = default_engine().run(collection)
+    serial = time.time() - start
+    print('1 process: %d tweets in %.2fs' % (expected.total, serial))
+    status = 0
+    for processes in args.processes:
+        start = time.time()
+        results = parallel_run(default_engine(), args.host, args.db, args.collection,
+                               processes=processes)
+        elapsed = time.time() - start
+        same = results.total == expected.total and all(
+            dict(results[name]) == dict(expected[name]) for name in expected)
+        if not same:
+            status = 1
+        print('%d processes: %.2fs, speedup %.1fx, %s' % (processes, elapsed, serial / elapsed,
+                                                          'same results' if same else 'RESULTS DIFFER'))
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,297 @@
+from __future__ import print_function
+import argparse
+import copy
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, MongoClient
+from analysis import AnalysisEngine, default_engine, merge_results
+from indexes import ensure_indexes
+from pipelines import ClientBackend
+from rollups import DATE_FORMAT
+from writer import store_batch
+
+#######################################################
+# Time partitioned tweet collections. Instead of one
+# collection per capture that grows forever, the tweets
+# go to one collection per hour or day of created_at:
+#   twitterBrazil_20191105     (bucket='day')
+#   twitterBrazil_2019110510   (bucket='hour')
+# Every tweet also gets 'created', created_at as a date,
+# so the partitions can be filtered by time and expired
+# by a TTL index. With a retention the partitions older
+# than it are dropped whole when a new one is started
+# (much cheaper than the TTL deletes, which only remove
+# the old tweets of the partitions on the limit).
+# PartitionReader runs the analysis over a time range
+# reading only the partitions in it, several at a time,
+# and merges the partial results
+#######################################################
+
+# Format of the suffix, its number of digits and the length of the bucket
+BUCKETS = {
+    'hour': ('%Y%m%d%H', 10, timedelta(hours=1)),
+    'day': ('%Y%m%d', 8, timedelta(days=1)),
+}
+
+# How the captures are partitioned, stream.py writes them this way and
+# analyze.py reads them the same way. BUCKET None keeps a single collection
+# ('day' or 'hour' partitions it), RETENTION_DAYS None keeps every partition
+# (a number of days drops the older ones, e.g. 30)
+BUCKET = None
+RETENTION_DAYS = None
+
+
+def retention_delta(days=RETENTION_DAYS):
+    return timedelta(days=days) if days else None
+
+
+def created(t):
+    # 'Tue Nov 05 10:23:12 +0000 2019' -> datetime(2019, 11, 5, 10, 23, 12), in UTC
+    return datetime.strptime(t['created_at'], DATE_FORMAT)
+
+
+class Partitions(object):
+    #The partitions of one capture, 'name' is the name the collection had
+    #before, the partitions are name_<bucket>. 'database' and 'name' are
+    #those of a collection so rollups.rollup_collection works with it
+
+    def __init__(self, database, name, bucket='day', retention=None, ttl=False):
+        if bucket not in BUCKETS:
+            raise ValueError('bucket must be one of ' + ', '.join(sorted(BUCKETS)))
+        if ttl and retention is None:
+            raise ValueError('a TTL needs a retention')
+        self.database = database
+        self.name = name
+        self.bucket = bucket
+        self.retention = retention
+        self.ttl = ttl
+        self.format, digits, self.length = BUCKETS[bucket]
+        self._pattern = re.compile(re.escape(name) + r'_(\d{%d})$' % digits)
+        # Partitions already prepared by this process
+        self._ready = set()
+        # Expired partitions that were already reported
+        self._warned = set()
+        self._lock = threading.Lock()
+
+    def partition_name(self, when):
+        return '%s_%s' % (self.name, when.strftime(self.format))
+
+    def bounds(self, partition):
+        # (start, end) of the hours/days of a partition name, None if the name
+        # is not a partition of this capture
+        m = self._pattern.match(partition)
+        if m is None:
+            return None
+        start = datetime.strptime(m.group(1), self.format)
+        return start, start + self.length
+
+    def names(self, start=None, end=None):
+        # Partitions that exist with tweets created in [start, end), oldest first
+        found = []
+        for partition in self.database.list_collection_names():
+            b = self.bounds(partition)
+            if b is None:
+                continue
+            if (start is None or b[1] > start) and (end is None or b[0] < end):
+                found.append((b[0], partition))
+        return [partition for _, partition in sorted(found)]
+
+    def route(self, batch):
+        # Tweets of the batch grouped by partition, setting 'created', and the
+        # tweets without a valid created_at
+        groups = OrderedDict()
+        invalid = []
+        for t in batch:
+            try:
+                t['created'] = created(t)
+            except (KeyError, TypeError, ValueError):
+                invalid.append(t)
+                continue
+            groups.setdefault(self.partition_name(t['created']), []).append(t)
+        return groups, invalid
+
+    def store(self, batch):
+        # writer.store_batch of every group of the batch in its partition, with
+        # the counts added up: (inserted, duplicates, errors, expired, stored).
+        # An error in one partition (creating its indexes, a lost connection...)
+        # only fails its tweets, the rest of the batch is still stored
+        inserted = duplicates = expired = 0
+        stored = []
+        limit = self._limit()
+        groups, invalid = self.route(batch)
+        errors = len(invalid)
+        if invalid:
+            print('%d tweets without a valid created_at were not stored' % len(invalid))
+        for partition, tweets in groups.items():
+            if limit is not None and self.bounds(partition)[1] <= limit:
+                expired += len(tweets)
+                self._warn_expired(partition)
+                continue
+            try:
+                i, d, e, s = store_batch(self.prepare(partition), tweets)
+            except Exception as e:
+                print('%s: %s' % (partition, e))
+                errors += len(tweets)
+                continue
+            inserted += i
+            duplicates += d
+            errors += e
+            stored += s
+        return inserted, duplicates, errors, expired, stored
+
+    def _warn_expired(self, partition):
+        # Once per partition, replaying an old capture with a retention would
+        # otherwise store nothing without a word
+        with self._lock:
+            if partition in self._warned:
+                return
+            self._warned.add(partition)
+        print('%s is older than the retention (%s), its tweets are not stored' % (partition, self.retention))
+
+    def prepare(self, partition):
+        # Indexes of a new partition. A new partition means a new hour/day has
+        # started, so it is also the moment to drop the expired ones
+        collection = self.database[partition]
+        with self._lock:
+            if partition in self._ready:
+                return collection
+        self.expire()
+        with self._lock:
+            ensure_indexes(collection)
+            if self.ttl:
+                collection.create_index([('created', ASCENDING)], name='created_ttl',
+                                        expireAfterSeconds=int(self.retention.total_seconds()))
+            else:
+                collection.create_index([('created', ASCENDING)], name='created')
+            self._ready.add(partition)
+        return collection
+
+    def _limit(self, now=None):
+        if self.retention is None:
+            return None
+        return (now or datetime.utcnow()) - self.retention
+
+    def expire(self, now=None):
+        # Drop the partitions that ended more than 'retention' ago, returns
+        # their names
+        limit = self._limit(now)
+        if limit is None:
+            return []
+        dropped = []
+        for partition in self.names(end=limit):
+            if self.bounds(partition)[1] <= limit:
+                self.database.drop_collection(partition)
+                with self._lock:
+                    self._ready.discard(partition)
+                dropped.append(partition)
+        return dropped
+
+
+class PartitionReader(object):
+    #Runs an analysis.AnalysisEngine over the tweets created in a time range.
+    #Only the partitions in the range are read, 'workers' of them at a time,
+    #and the partitions on the edges of the range are filtered by 'created'.
+    #make_engine returns a new engine with the same aggregators, every
+    #partition is counted by its own one and the results are merged
+
+    def __init__(self, partitions, make_engine=default_engine, workers=4):
+        self.partitions = partitions
+        self.make_engine = make_engine
+        self.workers = workers
+
+    def _query(self, partition, start, end):
+        b_start, b_end = self.partitions.bounds(partition)
+        match = {}
+        if start is not None and b_start < start:
+            match['$gte'] = start
+        if end is not None and b_end > end:
+            match['$lt'] = end
+        return {'created': match} if match else {}
+
+    def _scan(self, partition, start, end, query):
+        q = self._query(partition, start, end)
+        if query:
+            q = {'$and': [q, query]} if q else query
+        return self.make_engine().run(self.partitions.database[partition], q)
+
+    def run(self, start=None, end=None, query=None):
+        # Results of the tweets created in [start, end) that match query, empty
+        # counts if no partition has tweets in the range
+        names = self.partitions.names(start, end)
+        empty = self.make_engine().consume(())
+        if len(names) <= 1 or self.workers == 1:
+            return merge_results((self._scan(p, start, end, query) for p in names), empty)
+        with ThreadPoolExecutor(min(self.workers, len(names))) as pool:
+            parts = list(pool.map(lambda p: self._scan(p, start, end, query), names))
+        return merge_results(parts, empty)
+
+    def last(self, hours=6, query=None):
+        # Results of the last hours, from now
+        return self.run(datetime.utcnow() - timedelta(hours=hours), None, query)
+
+
+class PartitionBackend(ClientBackend):
+    #ClientBackend over the tweets created in [start, end), for analyze.py
+
+    def __init__(self, partitions, start=None, end=None, workers=4):
+        self.reader = PartitionReader(partitions, workers=workers)
+        self.start = start
+        self.end = end
+        self._results = None
+
+    def _default(self, name):
+        if self._results is None:
+            self._results = self.reader.run(self.start, self.end)
+        return self._results[name]
+
+    def _single(self, aggregator):
+        # A copy of the aggregator for every partition
+        reader = PartitionReader(self.reader.partitions, lambda: AnalysisEngine([copy.deepcopy(aggregator)]),
+                                 self.reader.workers)
+        return reader.run(self.start, self.end)[aggregator.name]
+
+
+def partition_collection(source, partitions, batch_size=1000):
+    # Copy the tweets of an old single collection into the partitions,
+    # returns the number of tweets stored
+    inserted = 0
+    batch = []
+    for t in source.find({}, batch_size=batch_size):
+        batch.append(t)
+        if len(batch) == batch_size:
+            inserted += partitions.store(batch)[0]
+            batch = []
+    if batch:
+        inserted += partitions.store(batch)[0]
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description='split a tweet collection by time and expire old partitions')
+    parser.add_argument('collection')
+    parser.add_argument('--host', default='mongodb://localhost')
+    parser.add_argument('--db', default='lab1')
+    parser.add_argument('--bucket', choices=sorted(BUCKETS), default=BUCKET or 'day')
+    parser.add_argument('--retention-days', type=float, default=RETENTION_DAYS,
+                        help='drop the partitions older than this')
+    parser.add_argument('--split', action='store_true',
+                        help='copy the tweets of the collection into its partitions')
+    args = parser.parse_args()
+
+    db = MongoClient(args.host)[args.db]
+    partitions = Partitions(db, args.collection, args.bucket, retention_delta(args.retention_days))
+    if args.split:
+        print('%d tweets copied' % partition_collection(db[args.collection], partitions))
+    for partition in partitions.expire():
+        print('dropped ' + partition)
+    for partition in partitions.names():
+        print('%s: %d tweets' % (partition, db[partition].estimated_document_count()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+from __future__ import print_function
+from analysis import (AnalysisEngine, LanguageCounter, TypeCounter, HashtagCounter,
+                      CountryCounter, MentionCounter, HashtagByCountry,
+                      MentionsByHashtag, HashtagsByMention, TYPES)
+from indexes import covering_index
+from rollups import RollupBackend
+
+#######################################################
+# Aggregation pipelines that count the tweets inside
+# mongo, only the top N rows are sent back to python
+#######################################################
+
+
+def _top(stages, key, n=None):
+    # Group by 'key', count and sort, most common first. Ties are sorted by key
+    # so the result is always the same
+    stages = list(stages) + [
+        {'$group': {'_id': key, 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1, '_id': 1}},
+    ]
+    if n is not None:
+        stages.append({'$limit': n})
+    return stages
+
+
+def languages_pipeline(n=None):
+    # Without _id the query is covered by the 'lang' index
+    return _top([{'$project': {'_id': 0, 'lang': 1}}], '$lang', n)
+
+
+def types_pipeline():
+    # Same rules as analysis.tweet_type, the stored type of the enriched tweets
+    def present(field):
+        return {'$ne': [{'$ifNull': [field, None]}, None]}
+    kind = {'$switch': {
+        'branches': [
+            {'case': present('$retweeted_status'), 'then': 'retweet'},
+            {'case': {'$ne': [{'$ifNull': ['$is_quote_status', False]}, False]}, 'then': 'quote_status'},
+            {'case': present('$in_reply_to_status_id'), 'then': 'reply'},
+        ],
+        'default': 'original'}}
+    return _top([{'$project': {'tweet_type': 1, 'retweeted_status.id': 1, 'is_quote_status': 1,
+                               'in_reply_to_status_id': 1}}], {'$ifNull': ['$tweet_type', kind]})
+
+
+def hashtags_pipeline(n=None):
+    return _top([{'$project': {'entities.hashtags.text': 1}},
+                 {'$unwind': '$entities.hashtags'}], '$entities.hashtags.text', n)
+
+
+def countries_pipeline(n=None):
+    return _top([{'$match': {'place.country': {'$type': 'string'}}},
+                 {'$project': {'_id': 0, 'place.country': 1}}], '$place.country', n)
+
+
+def mentions_pipeline(n=None):
+    return _top([{'$project': {'entities.user_mentions.screen_name': 1}},
+                 {'$unwind': '$entities.user_mentions'}],
+                '$entities.user_mentions.screen_name', n)
+
+
+def hashtags_by_country_pipeline(country, n=None):
+    return _top([{'$match': {'place.country': country}},
+                 {'$project': {'entities.hashtags.text': 1}},
+                 {'$unwind': '$entities.hashtags'}], '$entities.hashtags.text', n)
+
+
+def mentions_by_hashtag_pipeline(hashtag, n=None):
+    return _top([{'$match': {'entities.hashtags.text': hashtag}},
+                 {'$project': {'entities.user_mentions.screen_name': 1}},
+                 {'$unwind': '$entities.user_mentions'}],
+                '$entities.user_mentions.screen_name', n)
+
+
+def hashtags_by_mention_pipeline(screen_name, n=None):
+    # Hashtags are counted once for every time the user is mentioned in the
+    # tweet, as the client side count does
+    return _top([{'$match': {'entities.user_mentions.screen_name': screen_name}},
+                 {'$project': {'entities.hashtags.text': 1,
+                               'entities.user_mentions.screen_name': 1}},
+                 {'$unwind': '$entities.user_mentions'},
+                 {'$match': {'entities.user_mentions.screen_name': screen_name}},
+                 {'$unwind': '$entities.hashtags'}], '$entities.hashtags.text', n)
+
+
+#######################################################
+# Backends. Both return lists of (value, count) with
+# the most common first, like Counter.most_common, so
+# the plots can use either one
+#######################################################
+
+def _order(kv):
+    # Most common first and then by value, with null before any string as mongo
+    # sorts them
+    return (-kv[1], kv[0] is not None, kv[0] or '')
+
+
+class ServerBackend(object):
+    #Counts with aggregation pipelines inside mongo
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def _run(self, pipeline, field=None):
+        # field: the only field the pipeline reads, if it has an index the
+        # pipeline is told to use it and is answered from the index alone
+        options = {'allowDiskUse': True}
+        index = covering_index(self.collection, field) if field else None
+        if index is not None:
+            options['hint'] = index
+        cursor = self.collection.aggregate(pipeline, **options)
+        return [(row['_id'], row['count']) for row in cursor]
+
+    def languages(self, n=None):
+        return self._run(languages_pipeline(n), 'lang')
+
+    def types(self):
+        counts = dict.fromkeys(TYPES, 0)
+        counts.update(self._run(types_pipeline()))
+        return sorted(counts.items(), key=_order)
+
+    def hashtags(self, n=None):
+        return self._run(hashtags_pipeline(n))
+
+    def countries(self, n=None):
+        return self._run(countries_pipeline(n), 'place.country')
+
+    def mentions(self, n=None):
+        return self._run(mentions_pipeline(n))
+
+    def hashtags_by_country(self, country, n=None):
+        return self._run(hashtags_by_country_pipeline(country, n))
+
+    def mentions_by_hashtag(self, hashtag, n=None):
+        return self._run(mentions_by_hashtag_pipeline(hashtag, n))
+
+    def hashtags_by_mention(self, screen_name, n=None):
+        return self._run(hashtags_by_mention_pipeline(screen_name, n))
+
+
+class ClientBackend(object):
+    #Counts in python with the analysis engine. The default aggregators are
+    #computed in one pass the first time they are needed, the filtered queries
+    #do a pass of their own
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._results = None
+
+    def _default(self, name):
+        if self._results is None:
+            engine = AnalysisEngine([LanguageCounter(), TypeCounter(), HashtagCounter(),
+                                     CountryCounter(), MentionCounter(), HashtagByCountry()])
+            self._results = engine.run(self.collection)
+        return self._results[name]
+
+    def _single(self, aggregator):
+        return AnalysisEngine([aggregator]).run(self.collection)[aggregator.name]
+
+    @staticmethod
+    def _most_common(counter, n):
+        return sorted(counter.items(), key=_order)[:n]
+
+    def languages(self, n=None):
+        return self._most_common(self._default('languages'), n)
+
+    def types(self):
+        return self._most_common(self._default('types'), None)
+
+    def hashtags(self, n=None):
+        return self._most_common(self._default('hashtags'), n)
+
+    def countries(self, n=None):
+        return self._most_common(self._default('countries'), n)
+
+    def mentions(self, n=None):
+        return self._most_common(self._default('mentions'), n)
+
+    def hashtags_by_country(self, country, n=None):
+        return self._most_common(self._default('hashtags_by_country')[country], n)
+
+    def mentions_by_hashtag(self, hashtag, n=None):
+        return self._most_common(self._single(MentionsByHashtag(hashtag)), n)
+
+    def hashtags_by_mention(self, screen_name, n=None):
+        return self._most_common(self._single(HashtagsByMention(screen_name)), n)
+
+
+# 'rollup' reads the counters kept by rollups.RollupUpdater at ingest time
+BACKENDS = {'server': ServerBackend, 'client': ClientBackend, 'rollup': RollupBackend}
+
+
+def get_backend(collection, kind='server'):
+    if kind not in BACKENDS:
+        raise ValueError('unknown backend: ' + repr(kind))
+    return BACKENDS[kind](collection)
+
+
+def compare(collection, n=15, countries=(), hashtags=(), users=()):
+    # Run every query with both backends and return the ones that don't match,
+    # as a list of (query, server result, client result)
+    server = ServerBackend(collection)
+    client = ClientBackend(collection)
+    queries = [('languages', (n,)), ('types', ()), ('hashtags', (n,)),
+               ('countries', (n,)), ('mentions', (n,))]
+    queries += [('hashtags_by_country', (c, n)) for c in countries]
+    queries += [('mentions_by_hashtag', (h, n)) for h in hashtags]
+    queries += [('hashtags_by_mention', (u, n)) for u in users]
+    mismatches = []
+    for name, args in queries:
+        s = getattr(server, name)(*args)
+        c = getattr(client, name)(*args)
+        if s != c:
+            mismatches.append((name + repr(args), s, c))
+    return mismatches
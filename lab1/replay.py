@@ -0,0 +1,74 @@
+from __future__ import print_function, division
+import json
+import time
+from synthetic import generate_tweets
+
+#######################################################
+# Offline source for the stream listener. It calls
+# listener.on_data with recorded tweets (one json per
+# line, as the streaming API sends them) or with fake
+# ones, at a given rate or as fast as possible
+#######################################################
+
+
+def read_ndjson(path):
+    # Raw lines of a recorded capture, empty lines (keep-alives) are skipped
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def synthetic_ndjson(n, seed=0):
+    for t in generate_tweets(n, seed):
+        yield json.dumps(t)
+
+
+def dump_ndjson(collection, path, limit=0):
+    # Record the tweets of a collection so they can be replayed later
+    count = 0
+    with open(path, 'w') as f:
+        for t in collection.find({}, {'_id': 0}).limit(limit):
+            f.write(json.dumps(t, default=str) + '\n')
+            count += 1
+    return count
+
+
+class ReplaySource(object):
+    #Feeds the listener like tweepy.Stream does. rate is in tweets per second,
+    #None means as fast as possible. The time spent in every on_data call is
+    #kept in 'latencies' when record_latency is True
+
+    def __init__(self, listener, lines, rate=None, record_latency=False):
+        self.listener = listener
+        self.lines = lines
+        self.rate = rate
+        self.latencies = [] if record_latency else None
+        self.count = 0
+        self.elapsed = 0.0
+
+    def run(self):
+        listener = self.listener
+        latencies = self.latencies
+        clock = time.perf_counter
+        start = clock()
+        for i, line in enumerate(self.lines):
+            if self.rate:
+                # Wait until it is time to send this tweet
+                delay = start + i / self.rate - clock()
+                if delay > 0:
+                    time.sleep(delay)
+            if latencies is not None:
+                t0 = clock()
+                listener.on_data(line)
+                latencies.append(clock() - t0)
+            else:
+                listener.on_data(line)
+            self.count += 1
+        self.elapsed = clock() - start
+        # The stream ended, as if twitter had closed the connection
+        on_disconnect = getattr(listener, 'on_disconnect', None)
+        if on_disconnect is not None:
+            on_disconnect({'code': 0, 'reason': 'end of replay'})
+        return self
@@ -0,0 +1,118 @@
+from collections import Counter
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from analysis import tweet_type, hashtags, mentions, country, TYPES
+
+#######################################################
+# Counters of hashtags, languages, countries, mentions
+# and tweet types kept up to date while the tweets are
+# stored. One document per (kind, key, hour):
+#   {'kind': 'hashtag', 'key': '5Nov', 'hour': ..., 'count': 42}
+# 'hour' is None when the counts are not bucketed, so
+# the charts read as many documents as distinct keys
+# instead of every tweet
+#######################################################
+
+KINDS = ('hashtag', 'lang', 'country', 'mention', 'type')
+DATE_FORMAT = '%a %b %d %H:%M:%S +0000 %Y'
+
+
+def rollup_collection(collection):
+    # twitterBrazil -> twitterBrazil_rollups, in the same database
+    return collection.database[collection.name + '_rollups']
+
+
+def tweet_hour(t):
+    # 'Tue Nov 05 10:23:12 +0000 2019' -> datetime(2019, 11, 5, 10)
+    created = datetime.strptime(t['created_at'], DATE_FORMAT)
+    return created.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_keys(t):
+    keys = [('hashtag', h) for h in hashtags(t)]
+    keys += [('mention', m) for m in mentions(t)]
+    keys.append(('lang', t.get('lang')))
+    keys.append(('type', tweet_type(t)))
+    c = country(t)
+    if c is not None:
+        keys.append(('country', c))
+    return keys
+
+
+class RollupUpdater(object):
+    #Writer hook that adds the tweets of every stored batch to the rollups. The
+    #counts of the batch are added up first, so there is one $inc upsert per
+    #distinct key in the batch and not one per tweet
+
+    def __init__(self, collection, bucket=None):
+        if bucket not in (None, 'hour'):
+            raise ValueError('bucket must be None or "hour"')
+        self.rollups = rollup_collection(collection)
+        self.bucket = bucket
+        self.rollups.create_index([('kind', ASCENDING), ('key', ASCENDING), ('hour', ASCENDING)],
+                                  unique=True)
+        self.rollups.create_index([('kind', ASCENDING), ('hour', ASCENDING), ('count', DESCENDING)])
+
+    def __call__(self, batch):
+        self.update(batch)
+
+    def update(self, batch):
+        counts = Counter()
+        for t in batch:
+            hour = tweet_hour(t) if self.bucket == 'hour' else None
+            for kind, key in rollup_keys(t):
+                counts[(kind, key, hour)] += 1
+        if not counts:
+            return
+        ops = [UpdateOne({'kind': kind, 'key': key, 'hour': hour}, {'$inc': {'count': n}}, upsert=True)
+               for (kind, key, hour), n in counts.items()]
+        self.rollups.bulk_write(ops, ordered=False)
+
+
+def read_rollup(rollups, kind, n=None, start=None, end=None):
+    # Counts of one kind as (key, count), most common first. With hourly
+    # buckets, start and end limit the hours that are added up
+    match = {'kind': kind}
+    if start is not None or end is not None:
+        match['hour'] = {}
+        if start is not None:
+            match['hour']['$gte'] = start
+        if end is not None:
+            match['hour']['$lt'] = end
+    pipeline = [{'$match': match},
+                {'$group': {'_id': '$key', 'count': {'$sum': '$count'}}},
+                {'$sort': {'count': -1, '_id': 1}}]
+    if n is not None:
+        pipeline.append({'$limit': n})
+    return [(row['_id'], row['count']) for row in rollups.aggregate(pipeline)]
+
+
+class RollupBackend(object):
+    #Same interface as the backends in pipelines.py, reading the rollups of the
+    #collection instead of the tweets. Only the unfiltered counts are kept, so
+    #the per country/hashtag/user queries are not available
+
+    def __init__(self, collection, start=None, end=None):
+        self.rollups = rollup_collection(collection)
+        self.start = start
+        self.end = end
+
+    def _read(self, kind, n):
+        return read_rollup(self.rollups, kind, n, self.start, self.end)
+
+    def languages(self, n=None):
+        return self._read('lang', n)
+
+    def types(self):
+        counts = dict.fromkeys(TYPES, 0)
+        counts.update(self._read('type', None))
+        return sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+
+    def hashtags(self, n=None):
+        return self._read('hashtag', n)
+
+    def countries(self, n=None):
+        return self._read('country', n)
+
+    def mentions(self, n=None):
+        return self._read('mention', n)
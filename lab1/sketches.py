@@ -0,0 +1,300 @@
+from __future__ import division
+import hashlib
+import heapq
+import math
+import struct
+import threading
+from analysis import Aggregator, hashtags, mentions
+
+#######################################################
+# Top-k counting with bounded memory for hashtags and
+# mentions. A Counter keeps every value seen, which on
+# a long capture is mostly a long tail of values used
+# once. These structures keep a fixed number of them
+# and report how far their counts can be from exact
+#######################################################
+
+
+class _MinHeap(object):
+    #Min heap of (count, key) with lazy deletion, entries that don't match the
+    #current count of their key are skipped when popping
+
+    def __init__(self):
+        self.heap = []
+
+    def push(self, count, key):
+        heapq.heappush(self.heap, (count, key))
+
+    def pop_min(self, current):
+        # current: dict key -> count of the live entries
+        while self.heap:
+            count, key = heapq.heappop(self.heap)
+            if current.get(key) == count:
+                return count, key
+        raise IndexError('empty heap')
+
+    def peek_min(self, current):
+        while self.heap:
+            count, key = self.heap[0]
+            if current.get(key) == count:
+                return count, key
+            heapq.heappop(self.heap)
+        raise IndexError('empty heap')
+
+    def rebuild(self, current):
+        # Drop the stale entries once they are too many
+        if len(self.heap) > 4 * len(current) + 64:
+            self.heap = [(c, k) for k, c in current.items()]
+            heapq.heapify(self.heap)
+
+
+class SpaceSaving(object):
+    #Space-Saving algorithm (Metwally et al.). Keeps at most k values, when a new
+    #value arrives and the summary is full it replaces the least counted one and
+    #inherits its count. Every count is an overestimate by at most 'error' of
+    #that value, which is never more than total / k
+
+    def __init__(self, k=1000):
+        self.k = k
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        self._heap = _MinHeap()
+
+    @classmethod
+    def from_error(cls, epsilon):
+        # Counts are off by at most epsilon * total
+        return cls(int(math.ceil(1 / epsilon)))
+
+    def add(self, key, count=1):
+        self.total += count
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+        elif len(counts) < self.k:
+            counts[key] = count
+            self.errors[key] = 0
+        else:
+            low, evicted = self._heap.pop_min(counts)
+            del counts[evicted]
+            del self.errors[evicted]
+            counts[key] = low + count
+            self.errors[key] = low
+        self._heap.push(counts[key], key)
+        self._heap.rebuild(counts)
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def min_count(self):
+        if len(self.counts) < self.k:
+            return 0
+        return self._heap.peek_min(self.counts)[0]
+
+    def error_bound(self):
+        # No count is more than this above the real one
+        return self.min_count()
+
+    def most_common(self, n=None):
+        items = sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        return items[:n] if n is not None else items
+
+    def guaranteed(self, n):
+        # The values of the top n whose position is certain: their lowest
+        # possible count is higher than the count of the next value
+        top = self.most_common(n + 1)
+        following = top[n][1] if len(top) > n else self.min_count()
+        return [(k, c) for k, c in top[:n] if c - self.errors[k] >= following]
+
+    def merge(self, other):
+        # Mergeable summary: values missing in a full summary could have up to
+        # its minimum count, so that is added to their count and error
+        mine, theirs = self.min_count(), other.min_count()
+        merged = SpaceSaving(max(self.k, other.k))
+        merged.total = self.total + other.total
+        counts, errors = {}, {}
+        for key in set(self.counts) | set(other.counts):
+            counts[key] = self.counts.get(key, mine) + other.counts.get(key, theirs)
+            errors[key] = self.errors.get(key, mine) + other.errors.get(key, theirs)
+        for key, count in sorted(counts.items(), key=lambda kv: -kv[1])[:merged.k]:
+            merged.counts[key] = count
+            merged.errors[key] = errors[key]
+        merged._heap.heap = [(c, k) for k, c in merged.counts.items()]
+        heapq.heapify(merged._heap.heap)
+        return merged
+
+
+def _hashes(key, depth, width):
+    # Deterministic hashes (the same in every process, unlike hash()) made from
+    # one 128 bit digest with double hashing
+    digest = hashlib.blake2b(key.encode('utf-8') if not isinstance(key, bytes) else key,
+                             digest_size=16).digest()
+    h1, h2 = struct.unpack('<QQ', digest)
+    return [(h1 + i * h2) % width for i in range(depth)]
+
+
+class CountMinSketch(object):
+    #Count-Min sketch (Cormode and Muthukrishnan). Estimates are never below the
+    #real count and are above it by at most epsilon * total with probability
+    #1 - delta, using width * depth counters whatever the number of values
+
+    def __init__(self, width=2719, depth=5):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.rows = [[0] * width for _ in range(depth)]
+
+    @classmethod
+    def from_error(cls, epsilon, delta=0.01):
+        return cls(int(math.ceil(math.e / epsilon)), int(math.ceil(math.log(1 / delta))))
+
+    def add(self, key, count=1):
+        # Adds the count and returns the new estimate of the key
+        self.total += count
+        estimate = None
+        for row, i in zip(self.rows, _hashes(key, self.depth, self.width)):
+            row[i] += count
+            if estimate is None or row[i] < estimate:
+                estimate = row[i]
+        return estimate
+
+    def estimate(self, key):
+        return min(row[i] for row, i in zip(self.rows, _hashes(key, self.depth, self.width)))
+
+    def error_bound(self):
+        return math.e / self.width * self.total
+
+    def merge(self, other):
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError('sketches must have the same width and depth to be merged')
+        merged = CountMinSketch(self.width, self.depth)
+        merged.total = self.total + other.total
+        merged.rows = [[a + b for a, b in zip(r1, r2)] for r1, r2 in zip(self.rows, other.rows)]
+        return merged
+
+
+class CountMinTopK(object):
+    #Count-Min sketch plus a heap with the k values with the highest estimates
+
+    def __init__(self, k=100, epsilon=0.001, delta=0.01):
+        self.k = k
+        self.sketch = CountMinSketch.from_error(epsilon, delta)
+        self.top = {}
+        self._heap = _MinHeap()
+
+    @property
+    def total(self):
+        return self.sketch.total
+
+    def add(self, key, count=1):
+        estimate = self.sketch.add(key, count)
+        top = self.top
+        if key not in top and len(top) >= self.k:
+            if estimate <= self._heap.peek_min(top)[0]:
+                return
+            low, evicted = self._heap.pop_min(top)
+            del top[evicted]
+        top[key] = estimate
+        self._heap.push(estimate, key)
+        self._heap.rebuild(top)
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def error_bound(self):
+        return self.sketch.error_bound()
+
+    def most_common(self, n=None):
+        items = sorted(self.top.items(), key=lambda kv: (-kv[1], kv[0]))
+        return items[:n] if n is not None else items
+
+    def merge(self, other):
+        merged = CountMinTopK(max(self.k, other.k))
+        merged.sketch = self.sketch.merge(other.sketch)
+        for key in set(self.top) | set(other.top):
+            merged.top[key] = merged.sketch.estimate(key)
+        for key, _ in sorted(merged.top.items(), key=lambda kv: kv[1])[:max(0, len(merged.top) - merged.k)]:
+            del merged.top[key]
+        merged._heap.heap = [(c, k) for k, c in merged.top.items()]
+        heapq.heapify(merged._heap.heap)
+        return merged
+
+
+def accuracy(sketch, exact, n=15):
+    # How far the top n of a sketch is from the exact Counter: share of the real
+    # top n that was found, and the largest and mean difference of the counts
+    approx = sketch.most_common(n)
+    real = exact.most_common(n)
+    found = set(k for k, _ in approx) & set(k for k, _ in real)
+    diffs = [abs(c - exact[k]) for k, c in approx]
+    return {
+        'recall': len(found) / len(real) if real else 1.0,
+        'max_error': max(diffs) if diffs else 0,
+        'mean_error': sum(diffs) / len(diffs) if diffs else 0.0,
+        'error_bound': sketch.error_bound(),
+        'exact_values': len(exact),
+    }
+
+
+#######################################################
+# Use in the analysis engine and in the stream writer
+#######################################################
+
+class TopHashtags(Aggregator):
+    fields = ('entities.hashtags.text',)
+
+    def __init__(self, name='hashtags', sketch=None):
+        super(TopHashtags, self).__init__(name)
+        self.sketch = sketch if sketch is not None else SpaceSaving(1000)
+
+    def add(self, t):
+        self.sketch.update(hashtags(t))
+
+    def result(self):
+        return self.sketch
+
+
+class TopMentions(TopHashtags):
+    fields = ('entities.user_mentions.screen_name',)
+
+    def __init__(self, name='mentions', sketch=None):
+        super(TopMentions, self).__init__(name, sketch)
+
+    def add(self, t):
+        self.sketch.update(mentions(t))
+
+
+def add_sketches(engine, k=1000):
+    # Sketches of the hashtags and mentions next to the exact counters of the
+    # engine, as 'top_hashtags' and 'top_mentions'
+    engine.register(TopHashtags('top_hashtags', SpaceSaving(k)))
+    engine.register(TopMentions('top_mentions', SpaceSaving(k)))
+    return engine
+
+
+def sketch_accuracy(results, n=15):
+    # accuracy of the sketches of add_sketches against the exact counts of the
+    # same pass
+    return {
+        'hashtags': accuracy(results['top_hashtags'], results['hashtags'], n),
+        'mentions': accuracy(results['top_mentions'], results['mentions'], n),
+    }
+
+
+class HeavyHitters(object):
+    #Writer hook that keeps the top hashtags and mentions of the tweets stored.
+    #The writer may call it from two threads (background writes and flush), so
+    #the sketches are updated under a lock
+
+    def __init__(self, k=1000):
+        self.hashtags = SpaceSaving(k)
+        self.mentions = SpaceSaving(k)
+        self._lock = threading.Lock()
+
+    def __call__(self, batch):
+        with self._lock:
+            for t in batch:
+                self.hashtags.update(hashtags(t))
+                self.mentions.update(mentions(t))
@@ -1,7 +1,35 @@
 from __future__ import print_function
 import tweepy
 import json
-from pymongo import MongoClient
+from writer import MongoWriter, get_client
+from asyncingest import IngestPipeline, PipelineListener
+from indexes import ensure_indexes
+from enrich import Enricher
+from partitions import BUCKET, RETENTION_DAYS, Partitions, retention_delta
+from metrics import MetricsServer, StatsFile
+from rollups import RollupUpdater
+from sketches import HeavyHitters
+
+# 'async': the listener only queues the tweets and an asyncio pipeline parses and
+# stores them, so a slow mongo doesn't stall the stream. 'writer': the listener
+# parses them and hands them to a MongoWriter
+INGEST = 'async'
+QUEUE_SIZE = 10000
+DROP_POLICY = 'block'    # or 'drop_newest'/'drop_oldest' to never stall the stream
+# Store the tweet type, the full text and the detected language in every tweet
+# (starts a pool of language detection processes)
+ENRICH = False
+# With partitions.BUCKET set ('hour' or 'day') the tweets are stored in one
+# collection per hour or day (twitterBrazil_20191105...) and, if
+# partitions.RETENTION_DAYS is set, the ones older than it are dropped. They are
+# set in partitions.py so analyze.py reads what is written here
+
+# Ingest metrics (tweets received, parsed, stored, dropped, parse and insert
+# times, buffer depth) at http://127.0.0.1:METRICS_PORT/metrics in the Prometheus
+# text format, and/or written every STATS_INTERVAL seconds to STATS_FILE as json
+METRICS_PORT = None   # e.g. 9108
+STATS_FILE = None   # e.g. 'ingest_stats.json'
+STATS_INTERVAL = 10
 
 MONGO_HOST= 'mongodb://localhost/test'  # assuming you have mongoDB installed locally
                                         # and a database called 'test'
@@ -20,6 +48,12 @@ ACCESS_TOKEN_SECRET = "HERE_YOUR_ACCESS_TOKEN_SECRET"
 class StreamListener(tweepy.StreamListener):    
     #This is a class provided by tweepy to access the Twitter Streaming API. 
 
+    def __init__(self, writer, api=None):
+        super(StreamListener, self).__init__(api=api)
+        # The writer keeps the connection to mongo and stores the tweets in batches
+        self.writer = writer
+        self.metrics = writer.metrics
+
     def on_connect(self):
         # Called initially to connect to the Streaming API
         print("You are now connected to the streaming API.")
@@ -28,37 +62,97 @@ class StreamListener(tweepy.StreamListener):
         # On error - if an error occurs, display the error / status code
         print('An Error has occured: ' + repr(status_code))
         return False
+
+    def on_disconnect(self, notice):
+        # Twitter closed the stream, store the tweets that are still buffered
+        print('Disconnected: ' + repr(notice))
+        self.writer.flush()
  
     def on_data(self, data):
-        #This is the meat of the script...it connects to your mongoDB and stores the tweet
+        #This is the meat of the script...it decodes the tweet and hands it to the writer.
+        #Nothing is printed per tweet, the progress is in the metrics
+        metrics = self.metrics
+        metrics.received.inc()
         try:
-            client = MongoClient(MONGO_HOST)
-            
-            # Use test database. If it doesn't exist, it will be created.
-            db = client.test
-    
             # Decode the JSON from Twitter
-            datajson = json.loads(data)
-            
-            #grab the 'created_at' data from the Tweet to use for display
-            created_at = datajson['created_at']
-            username = datajson['user']['screen_name']
+            with metrics.parse_seconds.time():
+                datajson = json.loads(data)
+        except ValueError:
+            metrics.parse_errors.inc()
+            return True
+        # Limit and delete notices are not tweets
+        if 'created_at' not in datajson or 'user' not in datajson:
+            metrics.skipped.inc()
+            return True
+        metrics.parsed.inc()
+        #queue the data to be inserted into the mongoDB, the writer stores it in
+        #the collection twitterBrazil of the test database. If they don't exist,
+        #they will be created.
+        self.writer.write(datajson)
+        return True
 
-            #print out a message to the screen that we have collected a tweet
-            print("Tweet collected at " + str(created_at) + " from user @" + username)
-            
-            #insert the data into the mongoDB into a collection called twitter_search
-            #if twitter_search doesn't exist, it will be created.
-            db.twitterBrazil.insert(datajson)
-        except Exception as e:
-           print(e)
+class QueueListener(PipelineListener, tweepy.StreamListener):
+    #Puts the raw tweets in the queue of an asyncio.IngestPipeline, nothing else
+    #is done in the thread that reads the stream
 
-auth = tweepy.OAuthHandler(CONSUMER_KEY, CONSUMER_SECRET)
-auth.set_access_token(ACCESS_TOKEN, ACCESS_TOKEN_SECRET)
-#Set up the listener. The 'wait_on_rate_limit=True' is needed to help with Twitter API rate limiting.
-listener = StreamListener(api=tweepy.API(wait_on_rate_limit=True)) 
-streamer = tweepy.Stream(auth=auth, listener=listener)
-print("Tracking: " + str(WORDS))
-streamer.filter(track=WORDS)
+    def __init__(self, pipeline, api=None):
+        tweepy.StreamListener.__init__(self, api=api)
+        PipelineListener.__init__(self, pipeline)
+
+    def on_error(self, status_code):
+        print('An Error has occured: ' + repr(status_code))
+        return False
 
 
+if __name__ == '__main__':
+    auth = tweepy.OAuthHandler(CONSUMER_KEY, CONSUMER_SECRET)
+    auth.set_access_token(ACCESS_TOKEN, ACCESS_TOKEN_SECRET)
+    #Set up the listener. The 'wait_on_rate_limit=True' is needed to help with Twitter API rate limiting.
+    enricher = Enricher() if ENRICH else None
+    partitions = None
+    if BUCKET is not None:
+        partitions = Partitions(get_client(MONGO_HOST)['test'], 'twitterBrazil', BUCKET,
+                                retention_delta(RETENTION_DAYS))
+        partitions.expire()
+    if INGEST == 'async':
+        writer = IngestPipeline.for_host(MONGO_HOST, 'test', 'twitterBrazil',
+                                         queue_size=QUEUE_SIZE, policy=DROP_POLICY,
+                                         enrich=enricher, partitions=partitions)
+    else:
+        writer = MongoWriter(MONGO_HOST, 'test', 'twitterBrazil', enrich=enricher,
+                             partitions=partitions)
+    if partitions is None:
+        # Indexes for the queries, and a unique tweet id so replayed tweets are skipped.
+        # Every partition gets them when it is created
+        ensure_indexes(writer.collection)
+    # Keep the counts of hashtags, languages, countries, mentions and types per hour
+    # in twitterBrazil_rollups, so the charts don't need to read every tweet
+    writer.add_hook(RollupUpdater(partitions or writer.collection, bucket='hour'))
+    # Top hashtags and users mentioned during this run, in bounded memory
+    top = HeavyHitters(k=1000)
+    writer.add_hook(top)
+    registry = writer.metrics.registry
+    server = MetricsServer(registry, METRICS_PORT) if METRICS_PORT else None
+    stats_file = StatsFile(registry, STATS_FILE, STATS_INTERVAL) if STATS_FILE else None
+    api = tweepy.API(wait_on_rate_limit=True)
+    if INGEST == 'async':
+        listener = QueueListener(writer, api=api)
+    else:
+        listener = StreamListener(writer, api=api)
+    streamer = tweepy.Stream(auth=auth, listener=listener)
+    print("Tracking: " + str(WORDS))
+    try:
+        streamer.filter(track=WORDS)
+    finally:
+        # Store the tweets left in the buffer before exiting
+        writer.close()
+        if enricher is not None:
+            enricher.close()
+        if stats_file is not None:
+            stats_file.close()
+        if server is not None:
+            server.close()
+        if INGEST == 'async':
+            print("Ingest: " + str(writer.stats()))
+        print("Top hashtags: " + str(top.hashtags.most_common(15)))
+        print("Top users mentioned: " + str(top.mentions.most_common(15)))
@@ -0,0 +1,66 @@
+import random
+from datetime import datetime, timedelta
+
+#######################################################
+# Fake tweets with the same shape as the ones returned
+# by the streaming API, used to try the scripts without
+# a twitter account. Hashtags and users follow a long
+# tailed distribution like the real captures
+#######################################################
+
+LANGS = ['es', 'pt', 'en', 'und', 'fr', 'it', 'ca']
+COUNTRIES = ['United States', 'Brasil', 'Venezuela', 'España', 'Argentina', 'México', 'Colombia']
+HASHTAGS = ['SomosTodosAllan', 'DebateElectoral', 'FelizMartes', 'TuesdayThoughts', '5Nov',
+            'ElectionDay', 'UltimaHora', 'Ahora', 'paro', 'BuenMartes', 'TuesdayMorning',
+            'primerapagina', 'ChernobylSky', 'PorTuCaraDeMartes']
+USERS = ['allantercalivre', 'terca_livre', 'EuSouMBC', 'jairbolsonaro', 'Pablo_Iglesias_',
+         'Santi_ABASCAL', 'vox_es', 'NicolasMaduro', 'realDonaldTrump', 'AynRandPaulRyan']
+WORDS = ['vote', 'today', 'debate', 'hoy', 'martes', 'elecciones', 'governo', 'news', 'the',
+         'election', 'polls', 'noticia', 'liberdade', 'gobierno', 'pueblo', 'good', 'morning']
+DATE_FORMAT = '%a %b %d %H:%M:%S +0000 %Y'
+START = datetime(2019, 11, 5)
+
+
+def _pick(rnd, known, prefix, tail):
+    # Most of the time one of the known values, some times one of a long tail
+    # of rare ones
+    if rnd.random() < 0.8:
+        return known[min(int(rnd.paretovariate(1.2)) - 1, len(known) - 1)]
+    return prefix + str(int(rnd.paretovariate(0.5)) % tail)
+
+
+def generate_tweet(rnd, tweet_id, created_at):
+    tags = [_pick(rnd, HASHTAGS, 'tag', 100000) for _ in range(rnd.choice([0, 1, 1, 2, 3]))]
+    users = [_pick(rnd, USERS, 'user', 500000) for _ in range(rnd.choice([0, 0, 1, 1, 2]))]
+    words = [rnd.choice(WORDS) for _ in range(rnd.randint(3, 20))]
+    text = ' '.join(['@' + u for u in users] + words + ['#' + h for h in tags])
+    tweet = {
+        'id': tweet_id,
+        'id_str': str(tweet_id),
+        'created_at': created_at.strftime(DATE_FORMAT),
+        'text': text[:140],
+        'lang': rnd.choice(LANGS),
+        'user': {'id': rnd.randint(1, 10 ** 9), 'screen_name': _pick(rnd, USERS, 'user', 500000)},
+        'entities': {
+            'hashtags': [{'text': h, 'indices': [0, 0]} for h in tags],
+            'user_mentions': [{'screen_name': u, 'name': u, 'indices': [0, 0]} for u in users],
+            'urls': [],
+        },
+        'place': {'country': rnd.choice(COUNTRIES)} if rnd.random() < 0.05 else None,
+        'is_quote_status': rnd.random() < 0.05,
+        'in_reply_to_status_id': rnd.randint(1, 10 ** 9) if rnd.random() < 0.05 else None,
+    }
+    if len(text) > 140:
+        tweet['extended_tweet'] = {'full_text': text}
+    if rnd.random() < 0.6:
+        tweet['retweeted_status'] = {'id': rnd.randint(1, 10 ** 9), 'text': text[:140]}
+        if 'extended_tweet' in tweet:
+            tweet['retweeted_status']['extended_tweet'] = tweet.pop('extended_tweet')
+    return tweet
+
+
+def generate_tweets(n, seed=0, start=START, per_second=50):
+    # n fake tweets, 'per_second' of them for every second after 'start'
+    rnd = random.Random(seed)
+    for i in range(n):
+        yield generate_tweet(rnd, 1191000000000000000 + i, start + timedelta(seconds=i // per_second))
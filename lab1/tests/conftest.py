@@ -0,0 +1,31 @@
+import os
+import sys
+import pytest
+
+# The lab modules import each other by name, as when run from lab1/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+mongomock = pytest.importorskip('mongomock')
+
+from synthetic import generate_tweets  # noqa: E402
+import writer  # noqa: E402
+
+HOST = 'mongodb://mongomock'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # In memory mongo, also the one writer.get_client returns for HOST
+    client = mongomock.MongoClient()
+    monkeypatch.setitem(writer._clients, HOST, client)
+    return client
+
+
+@pytest.fixture
+def db(client):
+    return client.test
+
+
+@pytest.fixture
+def tweets():
+    return list(generate_tweets(300, seed=1))
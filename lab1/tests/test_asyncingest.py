@@ -0,0 +1,68 @@
+import asyncio
+import copy
+import json
+import pytest
+from asyncingest import IngestPipeline, _Marker, _RawQueue
+
+
+def payloads(tweets):
+    return [json.dumps(t) for t in copy.deepcopy(tweets)]
+
+
+def test_stores_everything_submitted(db, tweets):
+    pipeline = IngestPipeline(db.tweets, batch_size=50, flush_interval=0.01)
+    for raw in payloads(tweets) + ['not json', json.dumps({'limit': {'track': 1}})]:
+        pipeline.submit(raw)
+    assert pipeline.flush(5)
+    assert db.tweets.count_documents({}) == len(tweets)
+    assert pipeline.close(5)
+    stats = pipeline.stats()
+    assert (stats['inserted'], stats['parse_errors'], stats['skipped']) == (len(tweets), 1, 1)
+
+
+def test_drop_newest_when_full(db, tweets):
+    pipeline = IngestPipeline(db.tweets, queue_size=2, policy='drop_newest', flush_interval=0.01)
+    # The slots are taken as if two payloads were queued
+    pipeline._slots.acquire()
+    pipeline._slots.acquire()
+    assert not pipeline.submit(payloads(tweets[:1])[0])
+    pipeline._slots.release(2)
+    assert pipeline.submit(payloads(tweets[1:2])[0])
+    assert pipeline.close(5)
+    assert (pipeline.metrics.dropped.value, pipeline.inserted) == (1, 1)
+
+
+def test_drop_oldest_keeps_the_markers_in_place():
+    async def run():
+        queue = _RawQueue()
+        first, second = _Marker(), _Marker()
+        for item in (first, 'a', second, 'b'):
+            queue.put_nowait(item)
+        assert queue.drop_oldest()
+        assert [queue.get_nowait() for _ in range(queue.qsize())] == [first, second, 'b']
+        queue.put_nowait(first)
+        assert not queue.drop_oldest()
+        assert queue.qsize() == 1
+
+    asyncio.run(run())
+
+
+def test_a_dead_stage_is_raised_instead_of_hanging(db, tweets):
+    pipeline = IngestPipeline(db.tweets, flush_interval=0.01)
+
+    def broken(batch):
+        raise RuntimeError('broken')
+
+    pipeline._store = broken
+    pipeline.submit(payloads(tweets[:1])[0])
+    with pytest.raises(RuntimeError):
+        pipeline.flush(5)
+    with pytest.raises(RuntimeError):
+        pipeline.submit(payloads(tweets[1:2])[0])
+    with pytest.raises(RuntimeError):
+        pipeline.close(5)
+
+
+def test_unknown_policy(db):
+    with pytest.raises(ValueError):
+        IngestPipeline(db.tweets, policy='drop_all')
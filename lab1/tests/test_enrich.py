@@ -0,0 +1,23 @@
+import copy
+from analysis import full_text, tweet_type
+from enrich import FIELDS, Enricher
+
+
+def test_fields_of_every_tweet(tweets):
+    batch = copy.deepcopy(tweets[:50])
+    enricher = Enricher(processes=1)
+    enricher(batch)
+    for raw, t in zip(tweets, batch):
+        assert all(field in t for field in FIELDS)
+        assert t['tweet_type'] == tweet_type(raw)
+        assert t['full_text'] == full_text(raw)
+    assert enricher.enriched == 50
+
+
+def test_languages_are_cached():
+    enricher = Enricher(processes=1)
+    texts = ['the weather is very nice today in the city'] * 3 + ['http://t.co/x']
+    assert enricher.languages(texts) == ['en', 'en', 'en', 'und']
+    assert enricher.detected == 2
+    enricher.languages(texts[:1])
+    assert enricher.detected == 2
@@ -0,0 +1,58 @@
+from indexes import INDEXES, ensure_indexes, index_spec, missing_indexes
+
+
+class _Indexed(object):
+    # What a collection reports about its indexes, as the server does (mongomock
+    # leaves out partialFilterExpression)
+
+    def __init__(self, information):
+        self.information = information
+
+    def index_information(self):
+        return self.information
+
+
+def _information(models):
+    info = {'_id_': {'key': [('_id', 1)], 'v': 2}}
+    for m in models:
+        doc = dict(m.document)
+        info[doc.pop('name')] = dict(doc, key=list(doc['key'].items()), v=2)
+    return info
+
+
+def test_nothing_missing():
+    assert missing_indexes(_Indexed(_information(INDEXES))) == []
+
+
+def test_options_are_compared():
+    info = _information(INDEXES)
+    del info['tweet_id']['partialFilterExpression']
+    assert missing_indexes(_Indexed(info)) == ['tweet_id']
+    info['tweet_id']['partialFilterExpression'] = {'id': {'$exists': True}}
+    info['tweet_id']['unique'] = False
+    assert missing_indexes(_Indexed(info)) == ['tweet_id']
+
+
+def test_names_are_not_compared():
+    info = _information(INDEXES)
+    info['lang_1'] = info.pop('lang')
+    assert missing_indexes(_Indexed(info)) == []
+
+
+def test_spec_of_a_model_and_of_the_server():
+    model = [m for m in INDEXES if m.document['name'] == 'tweet_id'][0]
+    assert index_spec(model.document) == index_spec(_information([model])['tweet_id'])
+
+
+def test_conflicting_index_is_kept(db, capsys):
+    db.tweets.create_index([('lang', 1)], name='lang', unique=True)
+    assert 'lang' not in ensure_indexes(db.tweets)
+    assert db.tweets.index_information()['lang'].get('unique', False)
+    assert 'index lang not created' in capsys.readouterr().out
+
+
+def test_ensure_replaces_an_index_with_other_options(db, capsys):
+    db.tweets.create_index([('lang', 1)], name='lang', unique=True)
+    assert 'lang' in ensure_indexes(db.tweets, replace=True)
+    assert not db.tweets.index_information()['lang'].get('unique', False)
+    assert 'dropping index lang' in capsys.readouterr().out
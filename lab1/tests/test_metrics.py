@@ -0,0 +1,52 @@
+import json
+import os
+from metrics import IngestMetrics, Registry, StatsFile
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    counter = registry.counter('tweets_total', 'Tweets')
+    histogram = registry.histogram('write_seconds', 'Writes', buckets=(0.1, 1.0))
+    counter.inc(3)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+    lines = registry.render().splitlines()
+    assert '# TYPE tweets_total counter' in lines
+    assert 'tweets_total 3' in lines
+    assert 'write_seconds_bucket{le="0.1"} 1' in lines
+    assert 'write_seconds_bucket{le="1.0"} 2' in lines
+    assert 'write_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'write_seconds_count 3' in lines
+
+
+def test_histogram_quantile():
+    histogram = Registry().histogram('h', 'h', buckets=(1, 2, 3))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 1.5, 1.5, 2.5):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == 2
+    assert histogram.quantile(1) == 3
+
+
+def test_ingest_metrics():
+    metrics = IngestMetrics()
+    metrics.stored(8, 1, 1, 2)
+    metrics.watch_depth(lambda: 7)
+    metrics.observe_depth(12)
+    metrics.observe_depth(4)
+    snapshot = metrics.registry.snapshot()
+    assert snapshot['ingest_tweets_inserted_total'] == 8
+    assert snapshot['ingest_tweets_expired_total'] == 2
+    assert snapshot['ingest_buffer_depth'] == 7
+    assert snapshot['ingest_buffer_max_depth'] == 12
+
+
+def test_stats_file(tmp_path):
+    metrics = IngestMetrics()
+    metrics.received.inc(5)
+    path = str(tmp_path / 'stats.json')
+    StatsFile(metrics.registry, path, interval=60).close()
+    with open(path) as f:
+        assert json.load(f)['ingest_tweets_received_total'] == 5
+    assert not os.path.exists(path + '.tmp')
@@ -0,0 +1,107 @@
+import copy
+import json
+from datetime import datetime, timedelta
+import pytest
+from pymongo.errors import AutoReconnect
+import partitions as partitions_module
+from analysis import default_engine
+from asyncingest import IngestPipeline
+from conftest import HOST
+from partitions import PartitionReader, Partitions, created
+from synthetic import DATE_FORMAT
+from writer import MongoWriter
+
+
+def tweet(i, when):
+    return {'id': i, 'created_at': when.strftime(DATE_FORMAT), 'text': 'hi', 'lang': 'en',
+            'user': {'screen_name': 'u%d' % i},
+            'entities': {'hashtags': [{'text': 'tag%d' % (i % 3)}], 'user_mentions': []},
+            'place': None, 'is_quote_status': False}
+
+
+@pytest.fixture
+def flaky_indexes(monkeypatch):
+    # ensure_indexes fails the first 'fails[0]' times
+    fails = [1]
+    ensure = partitions_module.ensure_indexes
+
+    def flaky(collection):
+        if fails[0]:
+            fails[0] -= 1
+            raise AutoReconnect('connection lost')
+        return ensure(collection)
+
+    monkeypatch.setattr(partitions_module, 'ensure_indexes', flaky)
+    return fails
+
+
+def test_routes_by_day(db, tweets):
+    p = Partitions(db, 'tw', 'hour')
+    inserted, duplicates, errors, expired, stored = p.store(copy.deepcopy(tweets))
+    assert (inserted, errors, expired) == (len(tweets), 0, 0)
+    total = 0
+    for name in p.names():
+        start, end = p.bounds(name)
+        for t in db[name].find():
+            assert start <= t['created'] < end
+            total += 1
+    assert total == len(tweets)
+
+
+def test_expired_and_invalid_tweets_are_counted(db):
+    now = datetime.utcnow()
+    p = Partitions(db, 'tw', 'day', retention=timedelta(days=2))
+    batch = [tweet(1, now), tweet(2, now - timedelta(days=5)), {'id': 3, 'created_at': 'yesterday'}]
+    inserted, duplicates, errors, expired, stored = p.store(batch)
+    assert (inserted, errors, expired) == (1, 1, 1)
+    assert p.names() == [p.partition_name(now)]
+
+
+def test_a_failed_partition_only_fails_its_tweets(db, flaky_indexes):
+    now = datetime.utcnow()
+    p = Partitions(db, 'tw', 'day')
+    batch = [tweet(1, now), tweet(2, now - timedelta(days=1))]
+    inserted, duplicates, errors, expired, stored = p.store(batch)
+    assert (inserted, errors) == (1, 1)
+    # Prepared again on the next batch
+    assert p.store([tweet(3, now)])[:3] == (1, 0, 0)
+
+
+def test_writer_survives_partition_errors(db, flaky_indexes):
+    now = datetime.utcnow()
+    writer = MongoWriter(HOST, 'test', 'tw', batch_size=1, flush_interval=60,
+                         partitions=Partitions(db, 'tw', 'day'))
+    writer.write(tweet(1, now))
+    writer.flush()
+    writer.write(tweet(2, now))
+    writer.flush()
+    assert writer._thread.is_alive()
+    writer.close()
+    assert (writer.inserted, writer.errors) == (1, 1)
+
+
+def test_pipeline_survives_partition_errors(db, flaky_indexes):
+    now = datetime.utcnow()
+    pipeline = IngestPipeline(db.tw, flush_interval=0.01, partitions=Partitions(db, 'tw', 'day'))
+    pipeline.submit(json.dumps(tweet(1, now)))
+    assert pipeline.flush(5)
+    pipeline.submit(json.dumps(tweet(2, now)))
+    assert pipeline.flush(5)
+    assert pipeline.close(5)
+    assert (pipeline.inserted, pipeline.errors) == (1, 1)
+
+
+def test_reader_matches_a_single_collection(db, tweets):
+    p = Partitions(db, 'tw', 'hour')
+    p.store(copy.deepcopy(tweets))
+    flat = copy.deepcopy(tweets)
+    for t in flat:
+        t['created'] = created(t)
+    db.flat.insert_many(flat)
+    start = created(tweets[100])
+    end = created(tweets[250])
+    expected = default_engine().run(db.flat, {'created': {'$gte': start, '$lt': end}})
+    results = PartitionReader(p, workers=3).run(start, end)
+    assert results.total == expected.total
+    assert dict(results['hashtags']) == dict(expected['hashtags'])
+    assert dict(results['types']) == dict(expected['types'])
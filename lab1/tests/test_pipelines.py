@@ -0,0 +1,21 @@
+import copy
+from collections import Counter
+from analysis import default_engine
+from pipelines import ClientBackend, ServerBackend, compare
+
+
+def test_server_and_client_backends_agree(db, tweets):
+    db.tweets.insert_many(copy.deepcopy(tweets))
+    hashtags = Counter(h['text'] for t in tweets for h in t['entities']['hashtags'])
+    users = Counter(u['screen_name'] for t in tweets for u in t['entities']['user_mentions'])
+    countries = set(t['place']['country'] for t in tweets if t['place'])
+    assert compare(db.tweets, countries=sorted(countries),
+                   hashtags=[h for h, _ in hashtags.most_common(3)],
+                   users=[u for u, _ in users.most_common(3)]) == []
+
+
+def test_backends_count_every_tweet(db, tweets):
+    db.tweets.insert_many(copy.deepcopy(tweets))
+    assert sum(dict(ServerBackend(db.tweets).types()).values()) == len(tweets)
+    assert sum(dict(ClientBackend(db.tweets).types()).values()) == len(tweets)
+    assert default_engine().run(db.tweets).total == len(tweets)
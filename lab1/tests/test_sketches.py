@@ -0,0 +1,90 @@
+from collections import Counter
+from analysis import default_engine
+from sketches import (CountMinSketch, CountMinTopK, SpaceSaving, accuracy,
+                      add_sketches, sketch_accuracy)
+
+
+def stream(n, seed):
+    # Long tailed values, 'v0' the most frequent
+    return ['v%d' % (i % (seed + 7) % (1 + i % 5)) for i in range(n)]
+
+
+def test_space_saving_exact_under_k():
+    values = stream(1000, 1)
+    sketch = SpaceSaving(k=100)
+    sketch.update(values)
+    assert dict(sketch.most_common()) == dict(Counter(values))
+
+
+def test_space_saving_merge():
+    a, b = stream(2000, 1), stream(3000, 4)
+    left, right = SpaceSaving(k=3), SpaceSaving(k=3)
+    left.update(a)
+    right.update(b)
+    merged = left.merge(right)
+    exact = Counter(a + b)
+    assert merged.total == len(a) + len(b)
+    for key, count in merged.most_common():
+        # Never below the real count, and at most the error above it
+        assert exact[key] <= count <= exact[key] + merged.errors[key]
+    assert merged.most_common(1)[0][0] == exact.most_common(1)[0][0]
+
+
+def test_count_min_never_underestimates():
+    values = stream(5000, 2)
+    sketch = CountMinSketch(width=50, depth=4)
+    for v in values:
+        sketch.add(v)
+    for key, count in Counter(values).items():
+        assert count <= sketch.estimate(key) <= count + sketch.error_bound()
+
+
+def test_count_min_top_k():
+    values = stream(5000, 3)
+    sketch = CountMinTopK(k=3, epsilon=0.01)
+    sketch.update(values)
+    exact = Counter(values)
+    assert len(sketch.most_common()) == 3
+    assert sketch.most_common(1)[0][0] == exact.most_common(1)[0][0]
+    for key, count in sketch.most_common():
+        assert exact[key] <= count <= exact[key] + sketch.error_bound()
+
+
+def test_count_min_top_k_merge():
+    a, b = stream(2000, 1), stream(3000, 4)
+    left, right = CountMinTopK(k=3, epsilon=0.01), CountMinTopK(k=3, epsilon=0.01)
+    left.update(a)
+    right.update(b)
+    merged = left.merge(right)
+    exact = Counter(a + b)
+    assert merged.total == len(a) + len(b)
+    assert len(merged.most_common()) == 3
+    assert merged.most_common(1)[0][0] == exact.most_common(1)[0][0]
+
+
+def test_accuracy():
+    values = stream(1000, 1)
+    exact = Counter(values)
+    sketch = SpaceSaving(k=100)
+    sketch.update(values)
+    report = accuracy(sketch, exact, n=3)
+    assert report == {'recall': 1.0, 'max_error': 0, 'mean_error': 0.0,
+                      'error_bound': 0, 'exact_values': len(exact)}
+    small = SpaceSaving(k=2)
+    small.update(values)
+    report = accuracy(small, exact, n=3)
+    assert report['recall'] < 1.0
+    assert report['max_error'] <= report['error_bound']
+
+
+def test_sketches_in_the_engine(db, tweets):
+    db.tw.insert_many(tweets)
+    results = add_sketches(default_engine(), k=1000).run(db.tw)
+    report = sketch_accuracy(results)
+    assert results['top_hashtags'].total == sum(results['hashtags'].values())
+    for name in ('hashtags', 'mentions'):
+        # Exact under k, the top 15 may only differ in the ties of the last count
+        assert report[name]['max_error'] == 0
+        assert report[name]['exact_values'] == len(results[name])
+        sketch_counts = [c for _, c in results['top_' + name].most_common(15)]
+        assert sketch_counts == [c for _, c in results[name].most_common(15)]
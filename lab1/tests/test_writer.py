@@ -0,0 +1,65 @@
+import copy
+import pytest
+from conftest import HOST
+from indexes import ensure_indexes
+from writer import MongoWriter, store_batch, store_to
+
+
+def test_batches(db, tweets):
+    writer = MongoWriter(HOST, 'test', 'tweets', batch_size=100, flush_interval=60)
+    stored = []
+    writer.add_hook(stored.extend)
+    for t in copy.deepcopy(tweets):
+        writer.write(t)
+    writer.close()
+    assert writer.inserted == len(tweets)
+    assert writer.errors == 0
+    assert db.tweets.count_documents({}) == len(tweets)
+    assert len(stored) == len(tweets)
+    with pytest.raises(ValueError):
+        writer.write(tweets[0])
+
+
+def test_close_stores_the_buffer(db, tweets):
+    writer = MongoWriter(HOST, 'test', 'tweets', batch_size=1000, flush_interval=60)
+    for t in tweets[:10]:
+        writer.write(t)
+    writer.close()
+    assert db.tweets.count_documents({}) == 10
+
+
+def test_duplicates(db, tweets):
+    ensure_indexes(db.tweets)
+    writer = MongoWriter(HOST, 'test', 'tweets', batch_size=100, flush_interval=60)
+    stored = []
+    writer.add_hook(stored.extend)
+    for t in copy.deepcopy(tweets):
+        writer.write(t)
+    # Twitter sends tweets again after a reconnection
+    for t in copy.deepcopy(tweets[:50]):
+        writer.write(t)
+    writer.close()
+    assert writer.inserted == len(tweets)
+    assert writer.duplicates == 50
+    assert writer.errors == 0
+    assert db.tweets.count_documents({}) == len(tweets)
+    # Hooks only see the tweets that were stored
+    assert len(stored) == len(tweets)
+
+
+def test_store_batch_counts_duplicates(db, tweets):
+    ensure_indexes(db.tweets)
+    assert store_batch(db.tweets, copy.deepcopy(tweets[:20]))[:3] == (20, 0, 0)
+    inserted, duplicates, errors, stored = store_batch(db.tweets, copy.deepcopy(tweets[10:30]))
+    assert (inserted, duplicates, errors, len(stored)) == (10, 10, 0, 10)
+
+
+class _Broken(object):
+    # Partitions whose store fails like a lost connection
+
+    def store(self, batch):
+        raise RuntimeError('connection lost')
+
+
+def test_store_to_never_raises(db, tweets):
+    assert store_to(db.tweets, _Broken(), tweets[:5]) == (0, 0, 5, 0, [])
@@ -0,0 +1,190 @@
+from __future__ import print_function
+import threading
+import time
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+from metrics import IngestMetrics
+
+DUPLICATE_KEY = 11000
+
+# One MongoClient is shared by every writer created with the same host, the
+# client keeps its own connection pool so there is no need to open a new one
+# for every tweet
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(host):
+    with _clients_lock:
+        if host not in _clients:
+            _clients[host] = MongoClient(host)
+        return _clients[host]
+
+
+class MongoWriter(object):
+    #Buffers the tweets received by the stream listener and stores them in
+    #batches with insert_many. A batch is written when it reaches batch_size
+    #tweets or when flush_interval seconds have passed since the last write,
+    #whatever happens first. Writes are done in a background thread so the
+    #listener can keep reading from the stream while mongo is busy.
+    #Hooks are called in the same thread with the tweets of every batch that
+    #were stored. enrich(batch), if given, adds the derived fields to the
+    #tweets before the insert (see enrich.Enricher). With partitions (a
+    #partitions.Partitions) the tweets go to its time partitions instead of
+    #to 'collection'. The counts and the write latency are kept in metrics, a
+    #metrics.IngestMetrics (a new one by default).
+
+    def __init__(self, host, database, collection, batch_size=500, flush_interval=1.0,
+                 enrich=None, partitions=None, metrics=None):
+        self.client = get_client(host)
+        self.collection = self.client[database][collection]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enrich = enrich
+        self.partitions = partitions
+        self.metrics = metrics if metrics is not None else IngestMetrics()
+        self.metrics.watch_depth(lambda: len(self._buffer))
+        self.hooks = []
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='MongoWriter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, doc):
+        # Add a parsed tweet to the buffer, wakes up the writer thread if the
+        # batch is full
+        with self._cond:
+            if self._closed:
+                raise ValueError('write to a closed MongoWriter')
+            self._buffer.append(doc)
+            self.metrics.observe_depth(len(self._buffer))
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def add_hook(self, hook):
+        # hook(batch) is called after every insert with the stored tweets
+        self.hooks.append(hook)
+
+    @property
+    def inserted(self):
+        return self.metrics.inserted.value
+
+    @property
+    def duplicates(self):
+        return self.metrics.duplicates.value
+
+    @property
+    def errors(self):
+        return self.metrics.failed.value
+
+    def flush(self):
+        # Write whatever is in the buffer right now, from the calling thread
+        with self._cond:
+            batch = self._take()
+        self._insert(batch)
+
+    def close(self):
+        # Stop the writer thread and store the tweets that are still buffered.
+        # Called when the stream disconnects so no tweet is lost.
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _take(self):
+        batch = self._buffer
+        self._buffer = []
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.time() + self.flush_interval
+                while not self._closed and len(self._buffer) < self.batch_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                closed = self._closed
+                batch = self._take()
+            self._insert(batch)
+            if closed:
+                return
+
+    def _insert(self, batch):
+        if not batch:
+            return
+        enrich_batch(self.enrich, batch)
+        with self.metrics.write_seconds.time():
+            inserted, duplicates, errors, expired, batch = store_to(self.collection, self.partitions, batch)
+        self.metrics.stored(inserted, duplicates, errors, expired)
+        run_hooks(self.hooks, batch)
+
+
+def store_batch(collection, batch):
+    # insert_many of a batch of tweets. Returns the number of inserted,
+    # duplicated and failed tweets and the list of the stored ones
+    try:
+        # ordered=False so one bad document doesn't stop the rest of the batch
+        result = collection.insert_many(batch, ordered=False)
+        return len(result.inserted_ids), 0, 0, batch
+    except BulkWriteError as e:
+        errors = e.details['writeErrors']
+        # Tweets already stored (the unique index on the tweet id), twitter
+        # sends them again after a reconnection
+        others = [err for err in errors if err['code'] != DUPLICATE_KEY]
+        failed = set(err['index'] for err in errors)
+        if others:
+            print(e)
+        return (e.details['nInserted'], len(errors) - len(others), len(others),
+                [doc for i, doc in enumerate(batch) if i not in failed])
+    except Exception as e:
+        print(e)
+        return 0, 0, len(batch), []
+
+
+def store_to(collection, partitions, batch):
+    # store_batch in the collection, or in the time partitions if there are.
+    # Returns the inserted, duplicated, failed and expired (older than the
+    # retention of the partitions) tweets and the list of the stored ones.
+    # Never raises, so an error doesn't stop the thread of the writer
+    try:
+        if partitions is not None:
+            return partitions.store(batch)
+        inserted, duplicates, errors, stored = store_batch(collection, batch)
+        return inserted, duplicates, errors, 0, stored
+    except Exception as e:
+        print(e)
+        return 0, 0, len(batch), 0, []
+
+
+def enrich_batch(enrich, batch):
+    # A failed enrichment doesn't lose the batch, the tweets are stored
+    # without the fields and enrich.enrich_collection can add them later
+    if enrich is None:
+        return
+    try:
+        enrich(batch)
+    except Exception as e:
+        print(e)
+
+
+def run_hooks(hooks, batch):
+    # hook(batch) for every hook, an error in one doesn't stop the others
+    if not batch:
+        return
+    for hook in hooks:
+        try:
+            hook(batch)
+        except Exception as e:
+            print(e)
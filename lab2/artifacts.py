@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+#######################################################
+# On disk cache of the dictionary, corpus and models.
+# Every artifact is stored in a directory named after
+# the hash of its stage, its inputs (a fingerprint of
+# the tweet ids or the key of the artifact it is built
+# from) and its parameters, so it is built again only
+# when one of them changes. Reading an artifact marks
+# it as used, and when the cache is bigger than
+# max_bytes the least recently used ones are removed.
+# The artifacts loaded by a cache are pinned, they
+# are never removed while it may still be using them
+#######################################################
+
+KEY_LENGTH = 40
+
+
+def fingerprint(values):
+    # Hash of a sequence of ids (or any values), in order
+    h = hashlib.sha1()
+    for v in values:
+        h.update(str(v).encode('utf-8'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def _size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class ArtifactCache(object):
+
+    def __init__(self, path, max_bytes=2 * 1024 ** 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.pinned = set()
+        self._lock = threading.Lock()
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def key(self, stage, *inputs, **params):
+        # inputs: fingerprints or keys of other artifacts. params: anything
+        # that changes the result (stoplist, num_topics, seeds...)
+        data = json.dumps({'stage': stage, 'inputs': inputs, 'params': params},
+                          sort_keys=True, default=str)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def get(self, key, build, load):
+        # build(directory) writes the artifact in an empty directory and
+        # load(directory) reads it. The artifact is only built if it isn't
+        # in the cache, either way it is returned by load
+        directory = os.path.join(self.path, key)
+        if os.path.isdir(directory):
+            self.hits += 1
+            os.utime(directory, None)
+            self.pinned.add(key)
+            return load(directory)
+
+        self.misses += 1
+        tmp = '%s.tmp-%d-%d' % (directory, os.getpid(), threading.get_ident())
+        os.makedirs(tmp)
+        try:
+            build(tmp)
+            os.rename(tmp, directory)
+        except OSError:
+            # Built at the same time by someone else
+            if not os.path.isdir(directory):
+                raise
+        finally:
+            if os.path.isdir(tmp):
+                shutil.rmtree(tmp)
+        self.pinned.add(key)
+        self.evict()
+        return load(directory)
+
+    def model(self, key, cls, build):
+        # Shortcut for gensim objects: build() returns the object, it is stored
+        # with save() and read with cls.load()
+        def save(directory):
+            build().save(os.path.join(directory, 'model'))
+
+        def load(directory):
+            return cls.load(os.path.join(directory, 'model'))
+
+        return self.get(key, save, load)
+
+    def entries(self):
+        # (last use, bytes, key) of every artifact, least recently used first
+        found = []
+        for name in os.listdir(self.path):
+            directory = os.path.join(self.path, name)
+            if len(name) == KEY_LENGTH and os.path.isdir(directory):
+                found.append((os.path.getmtime(directory), _size(directory), name))
+        return sorted(found)
+
+    def size(self):
+        return sum(size for used, size, key in self.entries())
+
+    def release(self, key):
+        # The artifact is no longer used and can be evicted
+        self.pinned.discard(key)
+
+    def evict(self):
+        # Remove the least recently used artifacts that aren't pinned until the
+        # cache fits in max_bytes. Returns the removed keys
+        removed = []
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for used, size, key in entries)
+            for used, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                if key in self.pinned:
+                    continue
+                shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+                total -= size
+                removed.append(key)
+        return removed
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'artifacts': len(self.entries()), 'bytes': self.size()}
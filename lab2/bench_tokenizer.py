@@ -0,0 +1,86 @@
+from __future__ import print_function, division
+import argparse
+import json
+import os
+import string
+import sys
+import time
+from tokenizer import Tokenizer, tokenize_many
+
+#######################################################
+# Tokenizer benchmark: the list comprehension the
+# notebook used against Tokenizer in this process and
+# over a process pool, on the texts of the cache or on
+# fake tweets
+#######################################################
+
+
+def legacy(corpus, stoplist):
+    # The notebook version: the stoplist is a list and the punctuation table
+    # is built for every word
+    return [[word.translate(str.maketrans('', '', string.punctuation))
+             for word in str(document).lower().split() if word not in stoplist]
+            for document in corpus]
+
+
+def fake_texts(n, seed=0):
+    sys.path.append(os.path.join(os.pardir, 'lab1'))
+    from synthetic import generate_tweets
+    return [t['text'] for t in generate_tweets(n, seed)]
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def bench(texts, processes):
+    tokenizer = Tokenizer(urls=True)
+    stoplist = list(tokenizer.stoplist)
+    expected, legacy_seconds = timed(lambda: legacy(texts, stoplist))
+    single, single_seconds = timed(lambda: [tokenizer(t) for t in texts])
+    pooled, pool_seconds = timed(lambda: list(tokenize_many(texts, tokenizer, processes)))
+    # The comprehension keeps the words that were only punctuation as ''
+    same = [[w for w in doc if w] for doc in expected] == single == pooled
+    n = len(texts)
+    return {
+        'texts': n,
+        'same_tokens': same,
+        'legacy_seconds': legacy_seconds,
+        'tokenizer_seconds': single_seconds,
+        'pool_seconds': pool_seconds,
+        'legacy_texts_per_second': n / legacy_seconds,
+        'tokenizer_texts_per_second': n / single_seconds,
+        'pool_texts_per_second': n / pool_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cache', help='tweets cache saved by save_tables, by default fake tweets are used')
+    parser.add_argument('--tweets', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, help='pool size, by default the number of cores')
+    parser.add_argument('--json', action='store_true', help='print the report as json')
+    args = parser.parse_args()
+
+    if args.cache:
+        from bowcorpus import cache_texts
+        texts = list(cache_texts(args.cache))
+    else:
+        texts = fake_texts(args.tweets, args.seed)
+    report = bench(texts, args.processes)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print('%(texts)d texts, same tokens: %(same_tokens)s' % report)
+        print('comprehension  %(legacy_seconds).2fs  %(legacy_texts_per_second).0f texts/s' % report)
+        print('tokenizer      %(tokenizer_seconds).2fs  %(tokenizer_texts_per_second).0f texts/s' % report)
+        print('pool           %(pool_seconds).2fs  %(pool_texts_per_second).0f texts/s' % report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import os
+import pyarrow.parquet as pq
+from gensim import corpora
+from tokenizer import Tokenizer, tokenize_many
+from tweetcache import TWEETS
+from tweettables import full_text
+
+#######################################################
+# Streaming corpus for the topic models. The texts are
+# read from mongo or from the parquet cache one batch
+# at a time, the dictionary is built in one pass over
+# them and the bag of words is written to a MatrixMarket
+# file, so tfidf and lda read the documents from disk
+# instead of from lists in memory
+#######################################################
+
+
+def mongo_texts(collection, query=None, batch_size=1000, enriched=False):
+    # Full text of the tweets of a lab1 collection, by default the ones that
+    # twitter detected in english. enriched: every tweet has the full_text
+    # stored by the lab1 enricher, only that field is read
+    if query is None:
+        query = {'lang': 'en'}
+    if enriched:
+        projection = {'_id': 0, 'full_text': 1}
+    else:
+        projection = {'_id': 0, 'full_text': 1, 'text': 1, 'extended_tweet.full_text': 1,
+                      'retweeted_status.extended_tweet.full_text': 1}
+    for t in collection.find(query, projection, batch_size=batch_size):
+        yield full_text(t)
+
+
+def cache_texts(path, langs=('en',), batch_size=10000):
+    # Texts of the tweets table saved by tweetcache.save_tables in the given
+    # languages, read in record batches
+    tweets = pq.ParquetFile(os.path.join(path, TWEETS))
+    for batch in tweets.iter_batches(batch_size=batch_size, columns=['text', 'lang']):
+        df = batch.to_pandas()
+        if langs is not None:
+            df = df[df['lang'].isin(langs)]
+        for text in df['text']:
+            yield text
+
+
+class TokenCorpus(object):
+    #Tokens of every text. texts is a function that returns a new iterator of
+    #the texts, it is called on every pass so the corpus can be read many times.
+    #processes: tokenize in a pool of processes, by default in this one
+
+    def __init__(self, texts, tokenizer=None, processes=1):
+        self.texts = texts
+        self.tokenizer = tokenizer or Tokenizer()
+        self.processes = processes
+
+    def __iter__(self):
+        return tokenize_many(self.texts(), self.tokenizer, self.processes)
+
+
+class BowCorpus(object):
+
+    def __init__(self, tokens, dictionary):
+        self.tokens = tokens
+        self.dictionary = dictionary
+
+    def __iter__(self):
+        for doc in self.tokens:
+            yield self.dictionary.doc2bow(doc)
+
+
+def build_corpus(tokens, prefix):
+    # Dictionary and bag of words of the corpus, saved as <prefix>.dict and
+    # <prefix>.mm. Returns the dictionary and the corpus read from disk
+    dictionary = corpora.Dictionary(tokens)
+    dictionary.save(prefix + '.dict')
+    corpora.MmCorpus.serialize(prefix + '.mm', BowCorpus(tokens, dictionary))
+    return dictionary, corpora.MmCorpus(prefix + '.mm')
+
+
+def load_corpus(prefix):
+    return corpora.Dictionary.load(prefix + '.dict'), corpora.MmCorpus(prefix + '.mm')
@@ -0,0 +1,127 @@
+from __future__ import division
+import hashlib
+import os
+import numpy as np
+
+#######################################################
+# 2-D coordinates of the documents for the topic
+# cluster plot, from their topic weights:
+#   tsne:   exact t-SNE of all the documents
+#   sample: t-SNE of a sample stratified by dominant
+#           topic, the rest of the documents are placed
+#           at the weighted mean of their nearest
+#           neighbours in the sample
+#   pca:    projection on the first two components
+# 'auto' picks one by the number of documents. With an
+# ArtifactCache the coordinates are kept on disk and
+# shared by all the plots
+#######################################################
+
+METHODS = ('tsne', 'sample', 'pca')
+TSNE_MAX = 5000
+SAMPLE_MAX = 2000000
+
+
+def choose_method(n, tsne_max=TSNE_MAX, sample_max=SAMPLE_MAX):
+    if n <= tsne_max:
+        return 'tsne'
+    elif n <= sample_max:
+        return 'sample'
+    return 'pca'
+
+
+def _dense(weights):
+    if hasattr(weights, 'toarray'):
+        weights = weights.toarray()
+    return np.asarray(weights, dtype=np.float64)
+
+
+def tsne(X, random_state=0):
+    from sklearn.manifold import TSNE
+    model = TSNE(n_components=2, verbose=0, random_state=random_state, angle=.99, init='pca')
+    return model.fit_transform(X)
+
+
+def pca(X, random_state=0):
+    centered = X - X.mean(axis=0)
+    # The right singular vectors of the covariance, it is only topics x topics
+    u, s, vt = np.linalg.svd(np.dot(centered.T, centered))
+    return np.dot(centered, vt[:2].T)
+
+
+def stratified_sample(topics, size, random_state=0, min_per_topic=50):
+    # Positions of about 'size' documents, each dominant topic in proportion
+    # to its documents but with at least min_per_topic of them
+    rnd = np.random.RandomState(random_state)
+    labels, counts = np.unique(topics, return_counts=True)
+    picked = []
+    for label, count in zip(labels, counts):
+        take = min(count, max(min_per_topic, int(round(size * count / len(topics)))))
+        members = np.flatnonzero(topics == label)
+        picked.append(rnd.choice(members, take, replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def sample_tsne(X, random_state=0, sample_size=TSNE_MAX, neighbors=10, chunk=100000):
+    from sklearn.neighbors import KNeighborsRegressor
+    sample = stratified_sample(np.argmax(X, axis=1), sample_size, random_state)
+    coords = np.empty((len(X), 2))
+    coords[sample] = tsne(X[sample], random_state)
+    rest = np.ones(len(X), dtype=bool)
+    rest[sample] = False
+    rest = np.flatnonzero(rest)
+    knn = KNeighborsRegressor(n_neighbors=min(neighbors, len(sample)), weights='distance')
+    knn.fit(X[sample], coords[sample])
+    for i in range(0, len(rest), chunk):
+        part = rest[i:i + chunk]
+        coords[part] = knn.predict(X[part])
+    return coords
+
+
+BACKENDS = {'tsne': tsne, 'sample': sample_tsne, 'pca': pca}
+
+
+def weights_fingerprint(X):
+    return hashlib.sha1(np.ascontiguousarray(X).tobytes()).hexdigest()
+
+
+def embed(weights, method='auto', random_state=0, cache=None, key=None, **options):
+    # weights: documents x topics, dense or sparse (topics.doc_topic_matrix).
+    # options go to the back end (sample_size, neighbors...). cache: an
+    # artifacts.ArtifactCache, key: the key of the artifact the weights come
+    # from, by default a hash of the weights
+    X = _dense(weights)
+    if method == 'auto':
+        method = choose_method(len(X))
+    if method not in BACKENDS:
+        raise ValueError('unknown method %r, use one of %s' % (method, ', '.join(METHODS)))
+
+    def compute():
+        return BACKENDS[method](X, random_state=random_state, **options)
+
+    if cache is None:
+        return compute()
+    key = cache.key('embedding', key or weights_fingerprint(X), method=method,
+                    random_state=random_state, **options)
+    return cache.get(key,
+                     lambda d: np.save(os.path.join(d, 'coords.npy'), compute()),
+                     lambda d: np.load(os.path.join(d, 'coords.npy')))
+
+
+def topic_centers(coords, topics, num_topics):
+    # Mean position of the documents of each dominant topic
+    centers = np.zeros((num_topics, 2))
+    for t in range(num_topics):
+        members = topics == t
+        if members.any():
+            centers[t] = coords[members].mean(axis=0)
+    return centers
+
+
+def topic_mds(centers):
+    # mds function for pyLDAvis.prepare that places the topics at the given
+    # centers instead of running its own projection. Use with
+    # sort_topics=False so the topics are in the same order
+    def mds(topic_term_dists):
+        return centers[:len(topic_term_dists)]
+    return mds
@@ -0,0 +1,128 @@
+from __future__ import division
+import hashlib
+import sqlite3
+import time
+from multiprocessing import Pool
+from langdetect import DetectorFactory, detect
+
+#######################################################
+# Language detection of the tweet texts. Most of the
+# tweets are retweets with the same text, so every
+# distinct text is detected only once and the result
+# is kept in a sqlite file keyed by the hash of the
+# text. The texts not in the cache are detected in a
+# process pool. langdetect is random unless it is
+# seeded, every process uses the same seed so the
+# results are always the same
+#######################################################
+
+UNDEFINED = 'und'
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _seed(seed):
+    DetectorFactory.seed = seed
+
+
+def detect_lang(text):
+    try:
+        return detect(text)
+    except Exception:
+        # langdetect fails on texts without letters (only urls, emojis...)
+        return UNDEFINED
+
+
+class LangCache(object):
+    #Persistent hash -> language map
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE IF NOT EXISTS langs (hash TEXT PRIMARY KEY, lang TEXT)')
+
+    def get_many(self, hashes):
+        found = {}
+        hashes = list(hashes)
+        # sqlite limits the number of parameters of a query
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            query = 'SELECT hash, lang FROM langs WHERE hash IN (%s)' % ','.join('?' * len(chunk))
+            found.update(self.db.execute(query, chunk))
+        return found
+
+    def put_many(self, items):
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO langs VALUES (?, ?)', items)
+
+    def close(self):
+        self.db.close()
+
+
+class LanguageDetector(object):
+
+    def __init__(self, cache_path='langdetect_cache.sqlite', processes=None, seed=0, chunksize=256):
+        self.cache = LangCache(cache_path) if cache_path else None
+        self.processes = processes
+        self.seed = seed
+        self.chunksize = chunksize
+        self.total = 0
+        self.unique = 0
+        self.hits = 0
+        self.detected = 0
+        self.seconds = 0.0
+
+    def detect_many(self, texts):
+        # Language of every text, in the same order
+        start = time.time()
+        texts = list(texts)
+        hashes = [text_hash(t) for t in texts]
+        langs = {}
+        if self.cache is not None:
+            langs.update(self.cache.get_many(set(hashes)))
+        pending = {}
+        for h, t in zip(hashes, texts):
+            if h not in langs and h not in pending:
+                pending[h] = t
+        missing = list(pending)
+        results = self._detect([pending[h] for h in missing])
+        langs.update(zip(missing, results))
+        if self.cache is not None and missing:
+            self.cache.put_many(zip(missing, results))
+
+        self.total += len(texts)
+        self.unique += len(set(hashes))
+        self.detected += len(missing)
+        self.hits += len(set(hashes)) - len(missing)
+        self.seconds += time.time() - start
+        return [langs[h] for h in hashes]
+
+    def _detect(self, texts):
+        if not texts:
+            return []
+        if self.processes == 1 or len(texts) < self.chunksize:
+            _seed(self.seed)
+            return [detect_lang(t) for t in texts]
+        pool = Pool(self.processes, initializer=_seed, initargs=(self.seed,))
+        try:
+            return pool.map(detect_lang, texts, chunksize=self.chunksize)
+        finally:
+            pool.close()
+            pool.join()
+
+    def stats(self):
+        # hit_rate: distinct texts found in the cache, throughput: texts per second
+        return {
+            'texts': self.total,
+            'unique_texts': self.unique,
+            'cache_hits': self.hits,
+            'detected': self.detected,
+            'hit_rate': self.hits / self.unique if self.unique else 0.0,
+            'seconds': self.seconds,
+            'texts_per_second': self.total / self.seconds if self.seconds else 0.0,
+        }
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,199 @@
+from __future__ import print_function, division
+import cProfile
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from multiprocessing import cpu_count
+
+#######################################################
+# Per stage measurements of a pipeline. Every stage run
+# inside PipelineRunner.stage() gets its wall time, the
+# CPU time of this process and of the worker processes
+# it waited for, and the peak RSS while it ran (sampled
+# in a thread). Optionally each stage is also run under
+# cProfile (a .prof file per stage, for pstats/snakeviz)
+# or tracemalloc (the peak of the python allocations and
+# the lines that allocated most, in a .txt per stage).
+# The report is json, compare_reports tells which
+# stages got slower between two of them
+#######################################################
+
+PROFILES = (None, 'cprofile', 'tracemalloc')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes():
+    # Resident memory of this process now, or its peak so far where /proc is
+    # not available (ru_maxrss is in KiB on linux and bytes on macOS)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (IOError, OSError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _RssSampler(object):
+    #Highest RSS seen every 'interval' seconds while the stage runs
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='RssSampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+        return self.peak
+
+
+def _filename(index, name, suffix):
+    return '%02d_%s.%s' % (index, re.sub(r'[^\w.-]+', '_', name), suffix)
+
+
+class PipelineRunner(object):
+    #profile: None, 'cprofile' or 'tracemalloc', the dumps go to dump_dir
+
+    def __init__(self, profile=None, dump_dir='profiles', top_allocations=25):
+        if profile not in PROFILES:
+            raise ValueError('profile must be one of %r' % (PROFILES,))
+        self.profile = profile
+        self.dump_dir = dump_dir
+        self.top_allocations = top_allocations
+        self.stages = []
+        self.started = datetime.now().isoformat()
+
+    def _dump_path(self, name, suffix):
+        if not os.path.isdir(self.dump_dir):
+            os.makedirs(self.dump_dir)
+        return os.path.join(self.dump_dir, _filename(len(self.stages), name, suffix))
+
+    @contextmanager
+    def stage(self, name, **info):
+        # Measures the block. The dict it yields goes to the report with the
+        # measurements, e.g. info['items'] = number of tweets for the rate
+        info = dict(info)
+        profiler = None
+        if self.profile == 'cprofile':
+            profiler = cProfile.Profile()
+        elif self.profile == 'tracemalloc':
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        rss_start = rss_bytes()
+        sampler = _RssSampler()
+        times_start = os.times()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield info
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            times_end = os.times()
+            rss_peak = sampler.stop()
+            report = {
+                'stage': name,
+                'wall_seconds': wall,
+                'cpu_seconds': cpu,
+                # Only the worker processes that ended during the stage
+                'children_cpu_seconds': (times_end.children_user - times_start.children_user +
+                                         times_end.children_system - times_start.children_system),
+                'rss_start_bytes': rss_start,
+                'rss_peak_bytes': rss_peak,
+                'rss_end_bytes': rss_bytes(),
+            }
+            if profiler is not None:
+                report['profile'] = self._dump_path(name, 'prof')
+                profiler.dump_stats(report['profile'])
+            elif self.profile == 'tracemalloc':
+                report['traced_peak_bytes'] = tracemalloc.get_traced_memory()[1] - traced_start
+                report['profile'] = self._dump_path(name, 'tracemalloc.txt')
+                self._dump_allocations(report['profile'])
+            if info.get('items') and wall > 0:
+                report['items_per_second'] = info['items'] / wall
+            report.update(info)
+            self.stages.append(report)
+
+    def _dump_allocations(self, path):
+        stats = tracemalloc.take_snapshot().statistics('lineno')
+        with open(path, 'w') as f:
+            for stat in stats[:self.top_allocations]:
+                f.write('%s\n' % stat)
+
+    def run(self, name, function, *args, **kwargs):
+        # function(*args, **kwargs) as a stage, returns its result
+        with self.stage(name):
+            return function(*args, **kwargs)
+
+    def report(self, **meta):
+        # meta: anything that identifies the run (dataset, sizes, options)
+        return {
+            'started': self.started,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': cpu_count(),
+            'profile': self.profile,
+            'meta': meta,
+            'total_wall_seconds': sum(s['wall_seconds'] for s in self.stages),
+            'stages': self.stages,
+        }
+
+    def save(self, path, **meta):
+        report = self.report(**meta)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_reports(old, new, metric='wall_seconds', threshold=1.2, min_seconds=0.05):
+    # Stages of both reports as (stage, old value, new value, ratio, regressed).
+    # A stage regressed when it is 'threshold' times slower (or bigger) and
+    # the difference is over min_seconds, so tiny stages don't add noise
+    before = dict((s['stage'], s) for s in old['stages'])
+    rows = []
+    for stage in new['stages']:
+        name = stage['stage']
+        if name not in before or metric not in stage:
+            continue
+        a, b = before[name][metric], stage[metric]
+        ratio = b / a if a else float('inf')
+        regressed = ratio >= threshold and (b - a >= min_seconds if metric.endswith('seconds') else True)
+        rows.append((name, a, b, ratio, regressed))
+    return rows
+
+
+def format_report(report):
+    lines = ['%-12s %9s %9s %9s %10s' % ('stage', 'wall s', 'cpu s', 'child s', 'peak MiB')]
+    for s in report['stages']:
+        lines.append('%-12s %9.2f %9.2f %9.2f %10.1f' % (
+            s['stage'], s['wall_seconds'], s['cpu_seconds'], s['children_cpu_seconds'],
+            s['rss_peak_bytes'] / 1024 ** 2))
+    lines.append('%-12s %9.2f' % ('total', report['total_wall_seconds']))
+    return '\n'.join(lines)
@@ -0,0 +1,165 @@
+from __future__ import print_function, division
+import argparse
+import os
+import sys
+import pandas as pd
+from gensim import models
+from profiling import PROFILES, PipelineRunner, compare_reports, format_report, load_report
+
+#######################################################
+# The Lab2 analysis as a script, every step measured
+# by profiling.PipelineRunner:
+#   fetch -> tables -> langdetect -> sentiment ->
+#   tokenize -> corpus -> tfidf -> lda -> topics -> tsne
+# The tweets are read from mongo or generated (lab1
+# synthetic tweets), and the json report keeps the
+# sizes next to the times so runs over different
+# datasets can be compared:
+#   python run_pipeline.py --tweets 100000 --report a.json
+#   python run_pipeline.py --compare a.json b.json
+#######################################################
+
+
+def fetch_tweets(args):
+    if args.collection:
+        from pymongo import MongoClient
+        from tweettables import PROJECTION
+        cursor = MongoClient(args.host)[args.db][args.collection].find({}, PROJECTION)
+        if args.limit:
+            cursor = cursor.limit(args.limit)
+        return list(cursor)
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'lab1'))
+    from synthetic import generate_tweets
+    tweets = list(generate_tweets(args.tweets, args.seed))
+    for i, t in enumerate(tweets):
+        # build_tables uses _id as the tweet id, as it comes from mongo
+        t['_id'] = '%024x' % i
+    return tweets
+
+
+def run(args, runner):
+    from tweettables import build_tables
+    from langdetection import LanguageDetector
+    from sentiment import score_tweets
+    from tokenizer import Tokenizer, tokenize_many
+    from bowcorpus import build_corpus
+    from topicmodel import train_lda
+    from topics import doc_topic_matrix, format_topics_sentences
+    from embedding import embed
+
+    skip = set(args.skip or ())
+    with runner.stage('fetch') as info:
+        tweets = fetch_tweets(args)
+        info['items'] = len(tweets)
+
+    with runner.stage('tables') as info:
+        tables = build_tables(tweets)
+        del tweets
+        info['items'] = len(tables.tweets)
+
+    if 'langdetect' not in skip:
+        with runner.stage('langdetect') as info:
+            # Only the tweets without the language stored by the lab1 enricher
+            missing = tables.tweets['lang'].isna().values
+            texts = tables.tweets['text'].values[missing]
+            detector = LanguageDetector(args.lang_cache or None, processes=args.processes)
+            langs = tables.tweets['lang'].astype(object).to_numpy(copy=True)
+            langs[missing] = detector.detect_many(texts)
+            tables.tweets['lang'] = pd.Categorical(langs)
+            detector.close()
+            info['items'] = len(texts)
+    else:
+        # Twitter's language instead
+        lang = tables.tweets['lang'].astype(object)
+        tables.tweets['lang'] = pd.Categorical(lang.fillna(tables.tweets['tw_lang'].astype(object)))
+
+    if 'sentiment' not in skip:
+        with runner.stage('sentiment') as info:
+            tables.tweets['sentiment'] = tables.tweets['id'].map(
+                score_tweets(tables.tweets, args.processes))
+            info['items'] = int(tables.tweets['sentiment'].notna().sum())
+
+    with runner.stage('tokenize') as info:
+        texts = tables.tweets.loc[tables.tweets['lang'] == 'en', 'text'].tolist()
+        tokenizer = Tokenizer('english')
+        tokens = list(tokenize_many(texts, tokenizer, args.processes))
+        info['items'] = len(tokens)
+
+    with runner.stage('corpus') as info:
+        if not os.path.isdir(args.workdir):
+            os.makedirs(args.workdir)
+        dictionary, corpus_bow = build_corpus(tokens, os.path.join(args.workdir, 'corpus'))
+        info['items'] = len(corpus_bow)
+        info['terms'] = len(dictionary)
+
+    with runner.stage('tfidf') as info:
+        # tfidf[corpus] is lazy as in the notebook: this stage only measures
+        # the idf counts, the transformation is paid by the topics stage
+        tfidf = models.TfidfModel(corpus_bow)
+        corpus_tfidf = tfidf[corpus_bow]
+        info['items'] = len(corpus_bow)
+
+    with runner.stage('lda', topics=args.topics) as info:
+        lda = train_lda(corpus_bow, dictionary, args.topics, workers=args.workers, random_state=0)
+        info['items'] = len(corpus_bow)
+
+    with runner.stage('topics') as info:
+        corpus_lda = lda[corpus_tfidf]
+        doc_topics = doc_topic_matrix(corpus_lda, args.topics)
+        format_topics_sentences(lda, corpus_lda, tokens, matrix=doc_topics)
+        info['items'] = doc_topics.shape[0]
+
+    if 'tsne' not in skip:
+        with runner.stage('tsne', method=args.embedding) as info:
+            embed(doc_topics.toarray(), method=args.embedding)
+            info['items'] = doc_topics.shape[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='run the lab2 analysis measuring every stage')
+    parser.add_argument('--host', default='mongodb://localhost')
+    parser.add_argument('--db', default='lab1')
+    parser.add_argument('--collection', help='tweets from mongo, by default fake tweets are used')
+    parser.add_argument('--limit', type=int, help='read at most this many tweets from mongo')
+    parser.add_argument('--tweets', type=int, default=20000, help='number of fake tweets')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--topics', type=int, default=4)
+    parser.add_argument('--processes', type=int, help='worker processes, by default the number of cores')
+    parser.add_argument('--workers', type=int, help='LDA workers, by default all the cores but one')
+    parser.add_argument('--embedding', default='auto', help='embedding.embed method')
+    parser.add_argument('--lang-cache', help='sqlite cache of langdetection, by default none')
+    parser.add_argument('--skip', nargs='+', choices=['langdetect', 'sentiment', 'tsne'],
+                        help='stages to leave out')
+    parser.add_argument('--workdir', default='pipeline_run', help='directory of the corpus files')
+    parser.add_argument('--profile', choices=[p for p in PROFILES if p], help='profile every stage')
+    parser.add_argument('--dump-dir', default='profiles', help='directory of the profile dumps')
+    parser.add_argument('--report', help='write the json report here')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help="compare two reports instead of running")
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='slowdown ratio that counts as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        old, new = load_report(args.compare[0]), load_report(args.compare[1])
+        status = 0
+        for stage, a, b, ratio, regressed in compare_reports(old, new, threshold=args.threshold):
+            print('%-12s %9.2fs %9.2fs %6.2fx%s' % (stage, a, b, ratio, '  REGRESSION' if regressed else ''))
+            status = status or int(regressed)
+        return status
+
+    runner = PipelineRunner(args.profile, args.dump_dir)
+    try:
+        run(args, runner)
+    finally:
+        meta = dict(collection=args.collection, limit=args.limit,
+                    tweets=None if args.collection else args.tweets,
+                    topics=args.topics, processes=args.processes, workers=args.workers,
+                    embedding=args.embedding, skip=args.skip)
+        report = runner.save(args.report, **meta) if args.report else runner.report(**meta)
+        print(format_report(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+from __future__ import division
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+
+#######################################################
+# Sentiment of the tweets, with SentimentClassifier
+# for the ones in spanish and VADER for english. Each
+# tweet is scored once even if it has many rows (one
+# per mention), the texts are sent in batches of the
+# same language to a pool of processes that load the
+# models once, and the scores are joined back to all
+# the rows of the tweet. entity_sentiment_matrix
+# counts the mentions of each entity per sentiment
+# bucket in a single pass
+#######################################################
+
+LANGS = ('es', 'en')
+
+# Models of the current process, loaded by _load_models
+_models = {}
+
+
+def _load_models():
+    from classifier import SentimentClassifier
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    _models['es'] = SentimentClassifier()
+    _models['en'] = SentimentIntensityAnalyzer()
+
+
+def _score_batch(batch):
+    # batch: (lang, ids, texts) -> (ids, scores)
+    lang, ids, texts = batch
+    if not _models:
+        _load_models()
+    if lang == 'es':
+        clf = _models['es']
+        scores = [float(clf.predict(t)) for t in texts]
+    else:
+        sid = _models['en']
+        scores = [sid.polarity_scores(t)['compound'] for t in texts]
+    return ids, scores
+
+
+def _batches(tweets, batch_size):
+    for lang, group in tweets.groupby('lang', observed=True):
+        ids = group['id'].tolist()
+        texts = group['text'].tolist()
+        for i in range(0, len(ids), batch_size):
+            yield lang, ids[i:i + batch_size], texts[i:i + batch_size]
+
+
+def score_tweets(tweets, processes=None, batch_size=500):
+    # Score of every distinct tweet id in es/en, as a Series indexed by id
+    unique = tweets.drop_duplicates('id')
+    unique = unique[unique['lang'].isin(LANGS)][['id', 'lang', 'text']]
+    batches = list(_batches(unique, batch_size))
+    if processes == 1 or len(batches) <= 1:
+        results = map(_score_batch, batches)
+        pool = None
+    else:
+        pool = Pool(processes, initializer=_load_models)
+        results = pool.imap_unordered(_score_batch, batches)
+    try:
+        ids, scores = [], []
+        for batch_ids, batch_scores in results:
+            ids.extend(batch_ids)
+            scores.extend(batch_scores)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return pd.Series(scores, index=ids, name='sentiment', dtype=float)
+
+
+def score_sentiments(df, processes=None, batch_size=500):
+    # Rows of df in the languages with a model, with a 'sentiment' column
+    scores = score_tweets(df, processes, batch_size)
+    scored = df[df['lang'].isin(LANGS)].copy()
+    scored['sentiment'] = scored['id'].map(scores)
+    return scored
+
+
+SENTIMENTS = ('negative', 'neutral', 'positive')
+
+
+def sentiment_buckets(scores, edges=(0.45, 0.65)):
+    # Bucket of every score, 0 below the first edge up to len(edges) above the
+    # last one. A score equal to the first edge goes to the bucket above it and
+    # one equal to the others to the bucket below, so with the default edges
+    # neutral is 0.45 <= s <= 0.65. NaN scores get -1
+    scores = np.asarray(scores, dtype=float)
+    edges = np.asarray(edges, dtype=float)
+    buckets = np.searchsorted(edges, scores, side='left')
+    buckets += scores == edges[0]
+    buckets[np.isnan(scores)] = -1
+    return buckets
+
+
+def entity_sentiment_matrix(df, entities=None, top=None, edges=(0.45, 0.65), labels=None):
+    # Number of rows of each entity in each sentiment bucket, as a DataFrame
+    # entities x buckets. df: one row per mention with 'entity' and 'sentiment'.
+    # entities: the rows of the matrix, by default the 'top' most mentioned
+    # (all of them without top)
+    if labels is None:
+        labels = SENTIMENTS if len(edges) == 2 else [str(i) for i in range(len(edges) + 1)]
+    if len(labels) != len(edges) + 1:
+        raise ValueError('%d edges need %d labels' % (len(edges), len(edges) + 1))
+    if entities is None:
+        counts = df['entity'].value_counts()
+        entities = counts.index[:top] if top is not None else counts.index
+    entities = list(entities)
+
+    codes = pd.Categorical(df['entity'], categories=entities).codes.astype(np.int64)
+    buckets = sentiment_buckets(df['sentiment'].values, edges)
+    keep = (codes >= 0) & (buckets >= 0)
+    nbuckets = len(labels)
+    cells = np.bincount(codes[keep] * nbuckets + buckets[keep],
+                        minlength=len(entities) * nbuckets)
+    return pd.DataFrame(cells.reshape(len(entities), nbuckets),
+                        index=pd.Index(entities, name='entity'), columns=list(labels))
@@ -0,0 +1,55 @@
+import os
+from artifacts import ArtifactCache, fingerprint
+
+
+def write(text):
+    def build(directory):
+        with open(os.path.join(directory, 'data'), 'w') as f:
+            f.write(text)
+    return build
+
+
+def read(directory):
+    with open(os.path.join(directory, 'data')) as f:
+        return f.read()
+
+
+def test_built_once(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    key = cache.key('corpus', fingerprint(['1', '2']), num_topics=4)
+    assert cache.get(key, write('a'), read) == 'a'
+    assert cache.get(key, write('b'), read) == 'a'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_keys_change_with_inputs_and_params(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    key = cache.key('lda', 'x', num_topics=4)
+    assert key == cache.key('lda', 'x', num_topics=4)
+    assert key != cache.key('lda', 'x', num_topics=5)
+    assert key != cache.key('lda', 'y', num_topics=4)
+    assert fingerprint([1, 2]) != fingerprint([2, 1])
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=25)
+    keys = [cache.key('stage', str(i)) for i in range(3)]
+    for key in keys[:2]:
+        cache.get(key, write('x' * 10), read)
+    # A new session, the artifacts of the first one aren't in use anymore
+    cache = ArtifactCache(str(tmp_path), max_bytes=25)
+    cache.get(keys[2], write('x' * 10), read)
+    assert [key for _, _, key in cache.entries()] == keys[1:]
+    assert cache.size() <= 25
+
+
+def test_loaded_artifacts_are_not_evicted(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=15)
+    keys = [cache.key('stage', str(i)) for i in range(3)]
+    for key in keys[:2]:
+        cache.get(key, write('x' * 10), read)
+    assert [key for _, _, key in cache.entries()] == keys[:2]
+    cache.release(keys[0])
+    cache.release(keys[1])
+    cache.get(keys[2], write('x' * 10), read)
+    assert [key for _, _, key in cache.entries()] == keys[2:]
@@ -0,0 +1,28 @@
+import pytest
+from bowcorpus import TokenCorpus, build_corpus, load_corpus, mongo_texts
+from tokenizer import Tokenizer
+
+TEXTS = ['The cat sat', 'a dog ran', 'cat and dog', 'the dog sat']
+
+
+def test_corpus_is_read_on_every_pass(tmp_path):
+    tokens = TokenCorpus(lambda: iter(TEXTS), Tokenizer(stoplist=['the', 'a', 'and']))
+    assert list(tokens) == list(tokens) == [['cat', 'sat'], ['dog', 'ran'], ['cat', 'dog'], ['dog', 'sat']]
+    prefix = str(tmp_path / 'tweets')
+    dictionary, corpus = build_corpus(tokens, prefix)
+    assert len(corpus) == len(TEXTS)
+    loaded, loaded_corpus = load_corpus(prefix)
+    assert loaded.token2id == dictionary.token2id
+    assert [dict(doc) for doc in loaded_corpus] == [dict(dictionary.doc2bow(t)) for t in tokens]
+
+
+def test_stored_full_text_is_read():
+    mongomock = pytest.importorskip('mongomock')
+    collection = mongomock.MongoClient().db.tweets
+    collection.insert_many([
+        {'text': 'cut text', 'full_text': 'the whole text', 'lang': 'en'},
+        {'text': 'cut', 'extended_tweet': {'full_text': 'the extended text'}, 'lang': 'en'},
+        {'text': 'otro texto', 'lang': 'es'}])
+    assert list(mongo_texts(collection)) == ['the whole text', 'the extended text']
+    assert list(mongo_texts(collection, {'lang': 'en', 'full_text': {'$exists': True}},
+                            enriched=True)) == ['the whole text']
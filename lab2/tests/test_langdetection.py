@@ -0,0 +1,23 @@
+from langdetection import LanguageDetector
+
+TEXTS = ['the weather is very nice today in the city', 'http://t.co/x',
+         'the weather is very nice today in the city', 'el tiempo es muy bueno hoy en la ciudad']
+
+
+def test_distinct_texts_are_detected_once(tmp_path):
+    detector = LanguageDetector(str(tmp_path / 'langs.sqlite'), processes=1)
+    assert detector.detect_many(TEXTS) == ['en', 'und', 'en', 'es']
+    stats = detector.stats()
+    assert (stats['texts'], stats['unique_texts'], stats['detected']) == (4, 3, 3)
+    detector.close()
+
+
+def test_languages_are_kept_in_the_cache(tmp_path):
+    path = str(tmp_path / 'langs.sqlite')
+    first = LanguageDetector(path, processes=1)
+    langs = first.detect_many(TEXTS)
+    first.close()
+    second = LanguageDetector(path, processes=1)
+    assert second.detect_many(TEXTS) == langs
+    assert (second.stats()['detected'], second.stats()['hit_rate']) == (0, 1.0)
+    second.close()
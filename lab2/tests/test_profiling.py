@@ -0,0 +1,28 @@
+import json
+from profiling import PipelineRunner, compare_reports, format_report, load_report
+
+
+def report(**seconds):
+    return {'stages': [{'stage': name, 'wall_seconds': s} for name, s in seconds.items()]}
+
+
+def test_stages_are_measured(tmp_path):
+    runner = PipelineRunner()
+    with runner.stage('count', topics=4) as info:
+        info['items'] = sum(1 for _ in range(100000))
+    assert runner.run('sum', sum, range(10)) == 45
+    path = str(tmp_path / 'report.json')
+    saved = runner.save(path, tweets=100000)
+    assert load_report(path) == json.loads(json.dumps(saved))
+    count = saved['stages'][0]
+    assert (count['stage'], count['items'], count['topics']) == ('count', 100000, 4)
+    assert count['wall_seconds'] > 0 and count['rss_peak_bytes'] > 0
+    assert saved['meta'] == {'tweets': 100000}
+    assert 'count' in format_report(saved)
+
+
+def test_regressions():
+    rows = compare_reports(report(fetch=1.0, lda=2.0, tiny=0.01),
+                           report(fetch=1.1, lda=3.0, tiny=0.03, new=1.0))
+    assert [(name, regressed) for name, a, b, ratio, regressed in rows] == \
+        [('fetch', False), ('lda', True), ('tiny', False)]
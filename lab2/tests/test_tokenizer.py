@@ -0,0 +1,24 @@
+from tokenizer import Tokenizer, tokenize_many
+
+STOPLIST = ['the', 'a', 'rt']
+
+
+def test_tokens():
+    tokenizer = Tokenizer(stoplist=STOPLIST)
+    assert tokenizer('RT @user: the vote, today! https://t.co/x &amp; more') == \
+        ['user', 'vote', 'today', 'more']
+    assert Tokenizer(stoplist=STOPLIST, mentions=False, urls=True)('@user http://x.co') == ['httpxco']
+
+
+def test_same_tokenizer_from_its_params():
+    tokenizer = Tokenizer(stoplist=STOPLIST, urls=True, mentions=False)
+    copy = Tokenizer.from_params(tokenizer.params())
+    assert copy.params() == tokenizer.params()
+    text = 'RT @user the polls http://t.co/x'
+    assert copy(text) == tokenizer(text)
+
+
+def test_tokenize_many_keeps_the_order():
+    texts = ['text number %d' % i for i in range(50)]
+    tokenizer = Tokenizer(stoplist=STOPLIST)
+    assert list(tokenize_many(texts, tokenizer, processes=1)) == [tokenizer(t) for t in texts]
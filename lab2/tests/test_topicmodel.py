@@ -0,0 +1,50 @@
+import pytest
+from gensim import corpora
+from tokenizer import Tokenizer
+from topicmodel import load_topics, save_topics, train_lda, update_topics
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture
+def saved(tmp_path):
+    tokenizer = Tokenizer(stoplist=['the', 'a'], urls=True)
+    docs = [tokenizer(t) for t in ['the cat sat', 'a dog ran', 'cat and dog', 'the dog sat']]
+    dictionary = corpora.Dictionary(docs)
+    lda = train_lda([dictionary.doc2bow(d) for d in docs], dictionary, 2, workers=1, random_state=0)
+    path = str(tmp_path / 'topics')
+    save_topics(path, lda, dictionary, None, tokenizer, {'lang': 'en'})
+    return path, tokenizer
+
+
+def test_state_keeps_the_tokenizer_and_query(saved):
+    path, tokenizer = saved
+    state = load_topics(path)[2]
+    assert state['tokenizer'] == tokenizer.params()
+    assert state['query'] == {'lang': 'en'}
+    assert state['last_id'] is None
+
+
+def test_update_with_the_saved_settings(saved, capsys):
+    path, tokenizer = saved
+    collection = mongomock.MongoClient().db.tweets
+    collection.insert_many([{'text': 'the cat ran', 'lang': 'en'},
+                            {'text': 'el gato', 'lang': 'es'},
+                            {'text': 'a dog sat', 'lang': 'en'}])
+    assert update_topics(path, collection) == 2
+    state = load_topics(path)[2]
+    assert state['tokenizer'] == tokenizer.params()
+    assert state['query'] == {'lang': 'en'}
+    # Only the tweets stored after the last update
+    assert update_topics(path, collection) == 0
+    assert 'no tweet of tweets matches' in capsys.readouterr().out
+    collection.insert_one({'text': 'cat and dog', 'lang': 'en'})
+    assert update_topics(path, collection) == 1
+
+
+def test_query_that_matches_nothing_is_reported(saved, capsys):
+    path, tokenizer = saved
+    collection = mongomock.MongoClient().db.tweets
+    collection.insert_many([{'text': 'the cat ran'}, {'text': 'a dog sat'}])
+    assert update_topics(path, collection, query={'detected_lang': 'en'}) == 0
+    assert 'no tweet of tweets matches {"detected_lang": "en"}' in capsys.readouterr().out
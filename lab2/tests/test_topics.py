@@ -0,0 +1,34 @@
+from topics import doc_topic_matrix, dominant_topics, representative_texts, with_texts
+
+# Topic weights of 4 documents, the third one without any topic
+CORPUS = [[(0, 0.9), (1, 0.1)], [(1, 0.7)], [], [(0, 0.6), (1, 0.4)]]
+TEXTS = [['a'], ['b'], ['c'], ['d']]
+
+
+def test_dominant_topics():
+    df = dominant_topics(doc_topic_matrix(CORPUS, 2), {0: 'x', 1: 'y'})
+    assert df['DominantTopic'].tolist() == [0, 1, -1, 0]
+    assert df['TopicContrib%'].tolist() == [0.9, 0.7, 0.0, 0.6]
+    assert df['Keywords'].tolist()[:2] == ['x', 'y']
+
+
+def test_texts_are_streamed_up_to_the_last_row():
+    read = []
+
+    def texts():
+        for t in TEXTS:
+            read.append(t)
+            yield t
+
+    df = dominant_topics(doc_topic_matrix(CORPUS, 2))
+    head = with_texts(df.head(2), texts())
+    assert head['Text'].tolist() == [['a'], ['b']]
+    assert len(read) == 3
+    assert 'Text' not in df
+
+
+def test_representative_texts():
+    df = dominant_topics(doc_topic_matrix(CORPUS, 2))
+    best = representative_texts(df, iter(TEXTS))
+    assert best['DominantTopic'].tolist() == [0, 1]
+    assert best['Text'].tolist() == [['a'], ['b']]
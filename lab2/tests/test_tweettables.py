@@ -0,0 +1,31 @@
+from tweettables import build_tables
+
+
+def tweet(i, **fields):
+    t = {'_id': i, 'user': {'screen_name': 'user%d' % i}, 'text': 'text %d' % i, 'lang': 'en',
+         'entities': {'user_mentions': [{'screen_name': 'a'}, {'screen_name': 'b'}][:i % 3]}}
+    t.update(fields)
+    return t
+
+
+def test_tables():
+    tables = build_tables([tweet(0), tweet(1, retweeted_status={'id': 5}), tweet(2)])
+    assert list(tables.tweets['type']) == ['original', 'retweet', 'original']
+    assert list(tables.mentions['tweet']) == [1, 2, 2]
+    assert list(tables.tweets_of('b')['id']) == ['2']
+    assert dict(tables.entity_counts()) == {'a': 2, 'b': 1}
+
+
+def test_projected_tweets_without_is_quote_status():
+    # The projection leaves out the fields a tweet doesn't have
+    tables = build_tables([tweet(0, in_reply_to_status_id=3)])
+    assert list(tables.tweets['type']) == ['reply']
+
+
+def test_enriched_fields_are_used():
+    t = tweet(0, tweet_type='quote_status', full_text='the whole text', detected_lang='es')
+    tables = build_tables([t, tweet(1)])
+    assert list(tables.tweets['type']) == ['quote_status', 'original']
+    assert tables.tweets['text'][0] == 'the whole text'
+    assert tables.tweets['lang'][0] == 'es'
+    assert tables.tweets['lang'].isna()[1]
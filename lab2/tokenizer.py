@@ -0,0 +1,109 @@
+import re
+import string
+from multiprocessing import Pool, cpu_count
+
+#######################################################
+# Tokenizer of the texts for the topic models. The
+# stopwords of every language are a frozenset built
+# once, the punctuation table and the regular
+# expressions are compiled once, and urls, mentions
+# and html escapes (&amp;) are handled before the text
+# is split. tokenize_many runs it over a process pool
+# in windows of texts, so it works on a stream
+#######################################################
+
+EXTRA_STOPWORDS = ('RT', 'rt', '&amp;', '\n', "it's")
+PUNCTUATION = str.maketrans('', '', string.punctuation)
+URL = re.compile(r'https?://\S+')
+MENTION = re.compile(r'@\w+')
+ESCAPES = {'&amp;': '&', '&lt;': '<', '&gt;': '>'}
+ESCAPE = re.compile('|'.join(ESCAPES))
+
+_stopwords = {}
+
+
+def stopwords_for(lang='english', extra=EXTRA_STOPWORDS):
+    # nltk stopwords of the language, the punctuation and the extra words
+    key = (lang, tuple(extra))
+    if key not in _stopwords:
+        from nltk.corpus import stopwords
+        _stopwords[key] = frozenset(stopwords.words(lang)) | frozenset(string.punctuation) \
+            | frozenset(extra)
+    return _stopwords[key]
+
+
+class Tokenizer(object):
+    #Lower case words of a text without stopwords nor punctuation. urls=False
+    #removes the links and mentions=False the @users, by default their text is
+    #kept as a word like before ('@user' -> 'user')
+
+    def __init__(self, lang='english', extra=EXTRA_STOPWORDS, stoplist=None,
+                 urls=False, mentions=True):
+        self.lang = lang
+        self.stoplist = frozenset(stoplist) if stoplist is not None else stopwords_for(lang, extra)
+        self.urls = urls
+        self.mentions = mentions
+
+    def __call__(self, text):
+        text = str(text).lower()
+        if '&' in text:
+            text = ESCAPE.sub(lambda m: ESCAPES[m.group(0)], text)
+        if not self.urls:
+            text = URL.sub(' ', text)
+        if not self.mentions:
+            text = MENTION.sub(' ', text)
+        stoplist = self.stoplist
+        words = [word.translate(PUNCTUATION) for word in text.split() if word not in stoplist]
+        return [word for word in words if word]
+
+    def params(self):
+        # What changes the tokens, for the key of the cached corpus
+        return {'stoplist': sorted(self.stoplist), 'urls': self.urls, 'mentions': self.mentions}
+
+    @classmethod
+    def from_params(cls, params):
+        # The same tokenizer as the one params() came from
+        return cls(stoplist=params['stoplist'], urls=params['urls'], mentions=params['mentions'])
+
+
+_tokenizer = None
+
+
+def _set_tokenizer(tokenizer):
+    global _tokenizer
+    _tokenizer = tokenizer
+
+
+def _tokenize(text):
+    return _tokenizer(text)
+
+
+def _windows(texts, size):
+    window = []
+    for text in texts:
+        window.append(text)
+        if len(window) == size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def tokenize_many(texts, tokenizer=None, processes=None, chunksize=1000):
+    # Tokens of every text, in the same order, as a generator. Only a few
+    # chunks per process are read from texts at a time
+    tokenizer = tokenizer or Tokenizer()
+    if processes == 1:
+        for text in texts:
+            yield tokenizer(text)
+        return
+    processes = processes or cpu_count()
+    pool = Pool(processes, initializer=_set_tokenizer, initargs=(tokenizer,))
+    try:
+        window = chunksize * processes * 4
+        for part in _windows(texts, window):
+            for tokens in pool.map(_tokenize, part, chunksize=chunksize):
+                yield tokens
+    finally:
+        pool.close()
+        pool.join()
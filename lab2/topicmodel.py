@@ -0,0 +1,132 @@
+from __future__ import print_function
+import argparse
+import json
+import os
+import sys
+from bson import ObjectId
+from gensim import corpora, models
+from pymongo import MongoClient
+from bowcorpus import TokenCorpus, mongo_texts
+from tokenizer import Tokenizer
+
+#######################################################
+# LDA topic stage. The model is trained in several
+# processes with LdaMulticore (or in one with LdaModel)
+# and saved with its dictionary and the _id of the last
+# tweet it has seen. update_topics loads it and calls
+# lda.update() with only the tweets stored after that
+# _id, so the topics follow a live capture without
+# training from scratch. The tokenizer and the query of
+# the training tweets are saved with the model and the
+# updates use the same ones. The dictionary is not
+# changed by the updates, words that were not in it are
+# ignored
+#######################################################
+
+MODEL = 'lda.model'
+DICTIONARY = 'lda.dict'
+STATE = 'state.json'
+# Tweets of the updates when the query was not saved with the model
+DEFAULT_QUERY = {'lang': 'en'}
+
+
+def train_lda(corpus, dictionary, num_topics=4, workers=None, **kwargs):
+    # workers: training processes, None uses all the cores but one and 1
+    # trains in this process with LdaModel
+    if workers == 1:
+        return models.LdaModel(corpus, id2word=dictionary, num_topics=num_topics, **kwargs)
+    return models.LdaMulticore(corpus, id2word=dictionary, num_topics=num_topics,
+                               workers=workers, **kwargs)
+
+
+def save_topics(path, lda, dictionary, last_id=None, tokenizer=None, query=None):
+    # last_id: _id (or its string) of the newest tweet in the training corpus.
+    # tokenizer: the tokenizer.Tokenizer of the training texts, query: the
+    # mongo query (json) that selects the tweets of the training language
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    lda.save(os.path.join(path, MODEL))
+    dictionary.save(os.path.join(path, DICTIONARY))
+    state = {
+        'last_id': str(last_id) if last_id is not None else None,
+        'tokenizer': tokenizer.params() if tokenizer is not None else None,
+        'query': query,
+    }
+    with open(os.path.join(path, STATE), 'w') as f:
+        json.dump(state, f)
+
+
+def load_topics(path):
+    lda = models.LdaModel.load(os.path.join(path, MODEL))
+    dictionary = corpora.Dictionary.load(os.path.join(path, DICTIONARY))
+    with open(os.path.join(path, STATE)) as f:
+        state = json.load(f)
+    return lda, dictionary, state
+
+
+def _chunks(docs, size):
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def update_topics(path, collection, query=None, tokenizer=None, chunksize=2000):
+    # Update the saved model with the tweets of the collection newer than its
+    # last _id that match query. By default the query and the tokenizer are
+    # the ones saved with the model, so the new tweets are tokenized like the
+    # training ones. Returns the number of tweets used, a query that matches
+    # no new tweet is reported since it may not fit the stored tweets (e.g.
+    # detected_lang without the lab1 enricher)
+    lda, dictionary, state = load_topics(path)
+    if query is None:
+        query = state.get('query') or DEFAULT_QUERY
+    if tokenizer is None and state.get('tokenizer'):
+        tokenizer = Tokenizer.from_params(state['tokenizer'])
+    base = query
+    query = dict(query)
+    # The range is fixed before reading, tweets stored meanwhile are left
+    # for the next update
+    newest = list(collection.find(query, {'_id': 1}).sort('_id', -1).limit(1))
+    if not newest:
+        print('no tweet of %s matches %s' % (collection.name, json.dumps(base)))
+        return 0
+    bounds = {'$lte': newest[0]['_id']}
+    if state['last_id'] is not None:
+        bounds['$gt'] = ObjectId(state['last_id'])
+    query['_id'] = bounds
+
+    tokens = TokenCorpus(lambda: mongo_texts(collection, query), tokenizer)
+    count = 0
+    for chunk in _chunks((dictionary.doc2bow(doc) for doc in tokens), chunksize):
+        lda.update(chunk)
+        count += len(chunk)
+    if count:
+        save_topics(path, lda, dictionary, newest[0]['_id'], tokenizer, base)
+    else:
+        print('no tweet of %s matches %s after %s' % (collection.name, json.dumps(base),
+                                                      state['last_id']))
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='update a saved topic model with the new tweets')
+    parser.add_argument('path', help='directory of the model saved with save_topics')
+    parser.add_argument('--host', default='mongodb://localhost')
+    parser.add_argument('--db', default='lab1')
+    parser.add_argument('--collection', default='twitterTest2')
+    parser.add_argument('--chunksize', type=int, default=2000)
+    args = parser.parse_args()
+
+    collection = MongoClient(args.host)[args.db][args.collection]
+    count = update_topics(args.path, collection, chunksize=args.chunksize)
+    print('%d new tweets' % count)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+#######################################################
+# Dominant topic of every document of an LDA corpus.
+# The (topic, weight) lists of the documents are put
+# in a sparse documents x topics matrix once, the
+# dominant topic and its weight come from the argmax
+# and max of its rows, and the keywords are looked up
+# per topic instead of per document. The texts are
+# streamed and only the ones of the rows shown are
+# kept
+#######################################################
+
+COLUMNS = ['DominantTopic', 'TopicContrib%', 'Keywords']
+
+
+def doc_topic_matrix(corpus, num_topics):
+    # corpus: lda[bow] or any iterable of [(topic, weight), ...]. The output of
+    # a model with per_word_topics only uses the topic weights
+    indptr = [0]
+    indices = []
+    data = []
+    for row in corpus:
+        if row and isinstance(row, tuple):
+            row = row[0]
+        for topic, weight in row:
+            indices.append(topic)
+            data.append(weight)
+        indptr.append(len(indices))
+    return sparse.csr_matrix((np.array(data, dtype=np.float64),
+                              np.array(indices, dtype=np.int32),
+                              np.array(indptr, dtype=np.int64)),
+                             shape=(len(indptr) - 1, num_topics))
+
+
+def topic_keywords(ldamodel, topn=10):
+    # topic -> 'word, word, ...' of its topn words
+    return {t: ', '.join(word for word, prop in ldamodel.show_topic(t, topn))
+            for t in range(ldamodel.num_topics)}
+
+
+def dominant_topics(matrix, keywords=None):
+    # DominantTopic, TopicContrib% and Keywords of every row of the matrix.
+    # Documents without any topic get -1 and a contribution of 0
+    matrix = sparse.csr_matrix(matrix)
+    contrib = matrix.max(axis=1).toarray().ravel()
+    topic = np.asarray(matrix.argmax(axis=1)).ravel().astype(np.int64)
+    topic[np.diff(matrix.indptr) == 0] = -1
+    df = pd.DataFrame({'DominantTopic': topic, 'TopicContrib%': np.round(contrib, 4)},
+                      columns=COLUMNS[:2])
+    if keywords is not None:
+        df['Keywords'] = pd.Categorical.from_codes(
+            topic, [keywords[t] for t in range(matrix.shape[1])])
+    return df
+
+
+def with_texts(df, texts):
+    # Copy of df (rows indexed by document position) with the text of every
+    # row as the last column. texts is read once and only up to the last row,
+    # a TokenCorpus or any iterator works without the corpus in memory
+    wanted = set(int(i) for i in df.index)
+    last = max(wanted) if wanted else -1
+    found = {}
+    for i, text in enumerate(texts):
+        if i > last:
+            break
+        if i in wanted:
+            found[i] = text
+    df = df.copy()
+    df['Text'] = [found.get(int(i)) for i in df.index]
+    return df
+
+
+def format_topics_sentences(ldamodel, corpus, texts=None, matrix=None):
+    # Same columns as the notebook version, with the texts as the last column
+    # if they are given. matrix: the doc_topic_matrix of the corpus if it is
+    # already built
+    if matrix is None:
+        matrix = doc_topic_matrix(corpus, ldamodel.num_topics)
+    df = dominant_topics(matrix, topic_keywords(ldamodel))
+    if texts is not None:
+        df = with_texts(df, texts)
+    return df
+
+
+def representative_texts(sent_topics, texts=None):
+    # Row with the highest contribution of every dominant topic, with its text
+    # read from texts if they are given
+    best = sent_topics[sent_topics['DominantTopic'] >= 0]
+    best = best.sort_values('TopicContrib%', ascending=False, kind='mergesort')
+    best = best.drop_duplicates('DominantTopic').sort_values('DominantTopic')
+    if texts is not None:
+        best = with_texts(best, texts)
+    return best.reset_index(drop=True)
@@ -0,0 +1,34 @@
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tweettables import TweetTables
+
+#######################################################
+# On disk cache of the tweettables.TweetTables in
+# parquet. Columns with few distinct values are stored
+# as categoricals (dictionary encoded) and the text
+# once per tweet. Files are memory mapped when read,
+# and only the columns of the tweets table asked for
+# are loaded
+#######################################################
+
+TWEETS = 'tweets.parquet'
+MENTIONS = 'mentions.parquet'
+
+
+def save_tables(tables, path):
+    # tables: a tweettables.TweetTables, the text is already stored once per tweet
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    pq.write_table(pa.Table.from_pandas(tables.tweets, preserve_index=False),
+                   os.path.join(path, TWEETS))
+    pq.write_table(pa.Table.from_pandas(tables.mentions, preserve_index=False),
+                   os.path.join(path, MENTIONS))
+
+
+def load_tables(path, columns=None):
+    # columns: the columns of the tweets table to load, by default all of them
+    tweets = pq.read_table(os.path.join(path, TWEETS), columns=columns,
+                           memory_map=True).to_pandas()
+    mentions = pq.read_table(os.path.join(path, MENTIONS), memory_map=True).to_pandas()
+    return TweetTables(tweets, mentions)
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+#######################################################
+# Tweets in two tables instead of one row per mention
+# with a copy of the tweet:
+#   tweets:   one row per tweet (id, username, type,
+#             text, lang, tw_lang), with categoricals
+#   mentions: one row per mention, the position of the
+#             tweet in 'tweets' and the entity
+# Memory grows with tweets + mentions, and the queries
+# by entity are joins on the tweet position. The type,
+# the full text and the language stored by the lab1
+# enricher are used when the tweets have them
+#######################################################
+
+TYPES = ['original', 'retweet', 'quote_status', 'reply']
+
+# Fields build_tables reads, the small enriched ones and the raw ones for the
+# tweets stored without them
+PROJECTION = {'_id': 1, 'lang': 1, 'user.screen_name': 1, 'entities.user_mentions.screen_name': 1,
+              'tweet_type': 1, 'full_text': 1, 'detected_lang': 1,
+              'text': 1, 'extended_tweet.full_text': 1, 'retweeted_status.id': 1,
+              'retweeted_status.extended_tweet.full_text': 1, 'is_quote_status': 1,
+              'in_reply_to_status_id': 1}
+
+
+# tweet_type and full_text are the ones of lab1/analysis.py, kept in sync with
+# the fields its enricher stores
+def tweet_type(t):
+    if 'tweet_type' in t:
+        return t['tweet_type']
+    if t.get('retweeted_status') is not None:
+        return 'retweet'
+    elif t.get('is_quote_status', False) is not False:
+        return 'quote_status'
+    elif t.get('in_reply_to_status_id') is not None:
+        return 'reply'
+    return 'original'
+
+
+def full_text(t):
+    if 'full_text' in t:
+        return t['full_text']
+    if 'extended_tweet' in t:
+        return t['extended_tweet']['full_text']
+    elif 'retweeted_status' in t and 'extended_tweet' in t['retweeted_status']:
+        return t['retweeted_status']['extended_tweet']['full_text']
+    return t['text']
+
+
+class TweetTables(object):
+
+    def __init__(self, tweets, mentions):
+        self.tweets = tweets
+        self.mentions = mentions
+
+    def mention_rows(self, columns=('sentiment',), langs=None):
+        # One row per mention with the entity and the given columns of its
+        # tweet. With langs, only the mentions of tweets in those languages
+        rows = self.mentions
+        if langs is not None:
+            keep = self.tweets['lang'].isin(langs).values
+            rows = rows[keep[rows['tweet'].values]]
+        rows = rows.copy()
+        positions = rows['tweet'].values
+        for c in columns:
+            rows[c] = self.tweets[c].values[positions]
+        return rows.reset_index(drop=True)
+
+    def entity_counts(self):
+        return self.mentions['entity'].value_counts()
+
+    def tweets_of(self, entity):
+        # Tweets that mention the entity
+        positions = self.mentions.loc[self.mentions['entity'] == entity, 'tweet'].unique()
+        return self.tweets.iloc[np.sort(positions)]
+
+
+def build_tables(cursor, detector=None):
+    # cursor: tweets as stored by lab1 (PROJECTION is enough). 'lang' is the
+    # detected_lang of the enriched tweets, the others are detected with
+    # detector, a langdetection.LanguageDetector, or left empty without it
+    ids, usernames, types, texts, tw_langs, langs = [], [], [], [], [], []
+    mention_tweet, mention_entity = [], []
+    for pos, t in enumerate(cursor):
+        ids.append(str(t['_id']))
+        usernames.append(t['user']['screen_name'])
+        types.append(tweet_type(t))
+        texts.append(full_text(t))
+        tw_langs.append(t['lang'])
+        langs.append(t.get('detected_lang'))
+        for e in t['entities']['user_mentions']:
+            mention_tweet.append(pos)
+            mention_entity.append(e['screen_name'])
+
+    if detector is not None:
+        missing = [i for i, lang in enumerate(langs) if lang is None]
+        if missing:
+            for i, lang in zip(missing, detector.detect_many(texts[i] for i in missing)):
+                langs[i] = lang
+    tweets = pd.DataFrame({
+        'id': ids,
+        'username': pd.Categorical(usernames),
+        'type': pd.Categorical(types, categories=TYPES),
+        'text': texts,
+        'lang': pd.Categorical(langs),
+        'tw_lang': pd.Categorical(tw_langs),
+    }, columns=['id', 'username', 'type', 'text', 'lang', 'tw_lang'])
+    mentions = pd.DataFrame({
+        'tweet': np.array(mention_tweet, dtype=np.int32),
+        'entity': pd.Categorical(mention_entity),
+    }, columns=['tweet', 'entity'])
+    return TweetTables(tweets, mentions)